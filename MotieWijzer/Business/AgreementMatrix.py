@@ -0,0 +1,125 @@
+""" The AgreementMatrix computes for every pair of parties how often they voted the same on the filtered motions (Dutch:
+moties). Only motions during which both parties existed are counted, like get_partially_missing_parties ignores the
+motions during which a party did not exist. A party that existed but did not vote never agrees with another party,
+just like an absent party is considered to disagree with the user in the runner. The results are cached per filter and
+version of the motion store, such that the same agreement matrix can be requested again cheaply. """
+import csv
+import json
+import os
+import sys
+from datetime import date
+from typing import Any, Dict, List, Optional, TextIO
+
+import numpy as np
+
+from MotieWijzer.Business import FILTER_CACHE_DIRECTORY
+from MotieWijzer.Business.InfoRetriever import get_filter_key, load_filtered_motions
+from MotieWijzer.Business.PartyMasks import count_party_members, get_existing_masks, get_party_masks, \
+    unpack_party_masks
+
+AGREEMENT_CHUNK_SIZE = 65536  # The number of motions of which the party masks are unpacked at the same time.
+
+
+def compute_agreement(masks: np.ndarray, dictionary: List[str]) -> Dict[str, Any]:
+    """ Compute the agreement between all parties that existed during any of the motions, with matrix products over the
+    unpacked party masks, a chunk of motions at a time.
+
+    :param masks: The party masks of the motions (see build_party_masks).
+    :param dictionary: The global party dictionary of the masks.
+    :return: A dictionary with the number of motions (motions), the sorted parties (parties), for every pair of parties
+        on how many motions they voted the same (agreements) and on how many motions both existed (totals).
+    """
+    existing = np.flatnonzero(count_party_members(get_existing_masks(masks), len(dictionary)))
+    columns = sorted(existing, key=lambda i: dictionary[i])
+
+    agreements = np.zeros((len(columns), len(columns)), dtype=np.int64)
+    totals = np.zeros((len(columns), len(columns)), dtype=np.int64)
+    for start in range(0, masks.shape[1], AGREEMENT_CHUNK_SIZE):
+        votes = unpack_party_masks(masks[:, start:start + AGREEMENT_CHUNK_SIZE], len(dictionary))[:, :, columns]
+        # A float32 product is exact as long as the counts stay below 2^24 motions, which is far more than a chunk. A
+        # party with a split vote agrees with both the proponents and the opponents, but only once with another split.
+        in_favor, against = votes[0].astype(np.float32), votes[2].astype(np.float32)
+        split = (votes[0] & votes[2]).astype(np.float32)
+        exists = votes.any(axis=0).astype(np.float32)
+        agreements += np.rint(in_favor.T @ in_favor + against.T @ against - split.T @ split).astype(np.int64)
+        totals += np.rint(exists.T @ exists).astype(np.int64)
+    return {
+        "motions": masks.shape[1],
+        "parties": [dictionary[i] for i in columns],
+        "agreements": agreements.tolist(),
+        "totals": totals.tolist()
+    }
+
+
+def get_agreement_cache_path(start_date: date, end_date: date, regex: str, query: str) -> str:
+    """ Get the path in which the agreement matrix of a filter is cached (see get_filter_key). """
+    return f"{FILTER_CACHE_DIRECTORY}/{get_filter_key(start_date, end_date, regex, query)}.agreement.json"
+
+
+def load_agreement(start_date: date, end_date: date, regex: str, query: str = "") -> Dict[str, Any]:
+    """ Load the agreement matrix of the filtered motions (see compute_agreement) from the cache, or compute and cache
+    it if it was not computed yet for this filter and version of the motion store. """
+    path = get_agreement_cache_path(start_date, end_date, regex, query)
+    if os.path.isfile(path):
+        with open(path, "r") as f:
+            return json.load(f)
+
+    agreement = compute_agreement(*get_party_masks(load_filtered_motions(start_date, end_date, regex, query, ["Id"])))
+    os.makedirs(FILTER_CACHE_DIRECTORY, exist_ok=True)
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w") as f:
+        json.dump(agreement, f)
+    os.replace(temporary_path, path)
+    return agreement
+
+
+def get_percentage(agreements: int, total: int) -> Optional[float]:
+    """ Get the percentage of agreement, which is None if the parties never existed at the same time. """
+    return round(agreements / total * 100, 1) if total > 0 else None
+
+
+def get_percentages(agreement: Dict[str, Any]) -> List[List[Optional[float]]]:
+    """ Get the percentage of agreement (see get_percentage) of every pair of parties of an agreement matrix. """
+    return [[get_percentage(a, t) for a, t in zip(row, totals)]
+            for row, totals in zip(agreement["agreements"], agreement["totals"])]
+
+
+def write_agreement(agreement: Dict[str, Any], output: TextIO, format: str):
+    """ Write the agreement matrix.
+
+    :param agreement: The agreement matrix as returned by compute_agreement.
+    :param output: The file to which the agreement matrix is written.
+    :param format: Either 'tekst' for a line per party with the other parties from the highest to the lowest agreement,
+        'csv' for a row per pair of parties or 'json' for the agreement matrix with the percentages.
+    """
+    parties = agreement["parties"]
+    pairs = [(party, other, agreement["agreements"][i][j], agreement["totals"][i][j])
+             for i, party in enumerate(parties) for j, other in enumerate(parties)]
+    if format == "csv":
+        writer = csv.writer(output)
+        writer.writerow(["Party", "Other", "Agreements", "Total", "Percentage"])
+        writer.writerows([p, o, a, t, get_percentage(a, t)] for p, o, a, t in pairs)
+    elif format == "json":
+        json.dump({**agreement, "percentages": get_percentages(agreement)}, output)
+        output.write("\n")
+    else:
+        output.write(f"Aantal moties: {agreement['motions']}\n")
+        for party in parties:
+            others = sorted(((get_percentage(a, t), o) for p, o, a, t in pairs if p == party and o != party and t > 0),
+                            reverse=True)
+            output.write(f"{party}: {', '.join(f'{o} {pr:.1f}%' for pr, o in others)}\n")
+
+
+def run_agreement(start_date: date, end_date: date, regex: str, query: str, output_path: str, format: str):
+    """ Run the agreement matrix.
+
+    :param output_path: The path of the file to which the agreement matrix is written or '-' to write it to the console.
+    :param format: The format of the agreement matrix, either 'tekst', 'csv' or 'json' (see write_agreement).
+    """
+    agreement = load_agreement(start_date, end_date, regex, query)
+    if output_path == "-":
+        write_agreement(agreement, sys.stdout, format)
+        return
+
+    with open(output_path, "w", newline="") as f:
+        write_agreement(agreement, f, format)
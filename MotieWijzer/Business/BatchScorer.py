@@ -0,0 +1,140 @@
+""" The BatchScorer computes the agreement with every party for many respondents at once, without the interactive
+runner. Every respondent gives an answer set, which maps the Ids of motions (Dutch: moties) to '+' (in favor), '0' (no
+opinion) or '-' (against). """
+import csv
+import json
+import sys
+from collections import Counter as counter
+from typing import Counter, Dict, Iterator, List, TextIO, Tuple
+
+import numpy as np
+import pandas as pd
+
+from MotieWijzer.Business.MotionStore import load_motions
+from MotieWijzer.Business.PartyMasks import load_party_masks, unpack_party_masks
+from MotieWijzer.Business.PetitionerIndex import get_petitioners
+from MotieWijzer.Business.Runner import get_ranking
+
+CHUNK_SIZE = 1000  # The number of respondents of which the scores are computed at the same time.
+
+
+def read_answer_sets(path: str) -> List[Tuple[str, Dict[str, str]]]:
+    """ Read the answer sets of all respondents from a file.
+
+    :param path: The path of the file, which is either a JSON file (ending with .json) with an object that maps every
+        respondent to an object that maps motion Ids to answers, or a CSV file with the columns Respondent, Id and
+        Answer.
+    :return: For every respondent the name of the respondent and the answer set.
+    """
+    if path.endswith(".json"):
+        with open(path, "r") as f:
+            return [(str(respondent), answers) for respondent, answers in json.load(f).items()]
+
+    answers = pd.read_csv(path, dtype=str)
+    return [(respondent, dict(zip(group["Id"], group["Answer"])))
+            for respondent, group in answers.groupby("Respondent", sort=False)]
+
+
+def score_answer_sets(answer_sets: List[Tuple[str, Dict[str, str]]]) -> \
+        Iterator[Tuple[str, Counter[str], Counter[str], Counter[str], Counter[str]]]:
+    """ Compute the scores of every respondent with matrix products over the unpacked party masks of the answered
+    motions, a chunk of respondents at a time. The result is identical to answering the motions in the runner: for
+    every motion with an opinion the total of every existing party is increased (so absentee parties count as
+    disagreeing) and the score of every party that voted the same as the respondent is increased. The agreement with
+    the petitioners follows in the same way from the petitioner index, where a petitioner is in favor of its own
+    motions.
+
+    :param answer_sets: For every respondent the name of the respondent and the answer set. Answers on motions that
+        are not stored are ignored.
+    :return: For every respondent (as soon as its chunk is computed) the name of the respondent, how many times every
+        party voted the same as the respondent (scores) and on how many motions the respondent had an opinion while
+        the party existed (totals), followed by the scores and totals of the petitioners of the answered motions.
+    """
+    ids = load_motions(["Id"])["Id"].to_numpy()
+    positions = {id: position for position, id in enumerate(ids)}
+    masks, dictionary = load_party_masks()
+    for start in range(0, len(answer_sets), CHUNK_SIZE):
+        chunk = answer_sets[start:start + CHUNK_SIZE]
+        answered = sorted({positions[id] for _, answers in chunk for id, answer in answers.items()
+                           if id in positions and answer in ("+", "-")})
+        columns = {position: column for column, position in enumerate(answered)}
+
+        in_favor = np.zeros((len(chunk), len(answered)), dtype=np.float32)
+        against = np.zeros((len(chunk), len(answered)), dtype=np.float32)
+        for row, (_, answers) in enumerate(chunk):
+            for id, answer in answers.items():
+                if id not in positions:
+                    continue
+                if answer == "+":
+                    in_favor[row, columns[positions[id]]] = 1.0
+                elif answer == "-":
+                    against[row, columns[positions[id]]] = 1.0
+
+        # Like in update_scores a party is counted for every column in PARTY_COLUMNS that it is in.
+        proponents, absentees, opponents = unpack_party_masks(masks[:, answered], len(dictionary)).astype(np.float32)
+        totals = (in_favor + against) @ (proponents + absentees + opponents)
+        scores = in_favor @ proponents + against @ opponents
+
+        # The petitioners of the answered motions are looked up once per chunk in the petitioner index.
+        answered_petitioners = get_petitioners(ids[answered].tolist())
+        petitioners = sorted({p for ps in answered_petitioners.values() for p in ps})
+        petitioner_columns = {p: column for column, p in enumerate(petitioners)}
+        petitions = np.zeros((len(answered), len(petitioners)), dtype=np.float32)
+        for column, id in enumerate(ids[answered]):
+            petitions[column, [petitioner_columns[p] for p in answered_petitioners.get(id, [])]] = 1.0
+        petitioner_totals = (in_favor + against) @ petitions
+        petitioner_scores = in_favor @ petitions
+
+        for row, (respondent, _) in enumerate(chunk):
+            existing = np.flatnonzero(totals[row])
+            submitted = np.flatnonzero(petitioner_totals[row])
+            yield (respondent, counter({dictionary[p]: int(scores[row, p]) for p in existing}),
+                   counter({dictionary[p]: int(totals[row, p]) for p in existing}),
+                   counter({petitioners[p]: int(petitioner_scores[row, p]) for p in submitted}),
+                   counter({petitioners[p]: int(petitioner_totals[row, p]) for p in submitted}))
+
+
+def write_results(results: Iterator[Tuple[str, Counter[str], Counter[str], Counter[str], Counter[str]]],
+                  output: TextIO, format: str):
+    """ Write the results of the respondents as soon as they are computed.
+
+    :param results: The results as returned by score_answer_sets.
+    :param output: The file to which the results are written.
+    :param format: Either 'csv' for a row per respondent and party or petitioner (where the other column is empty), or
+        'json' for a JSON object per respondent per line. In both cases the parties and petitioners of a respondent are
+        ordered from the highest to the lowest agreement.
+    """
+    writer = csv.writer(output) if format == "csv" else None
+    if writer is not None:
+        writer.writerow(["Respondent", "Party", "Petitioner", "Score", "Total", "Percentage"])
+
+    for respondent, scores, totals, petitioner_scores, petitioner_totals in results:
+        ranking = [(p, s, t, round(rs, 1)) for p, s, t, rs in get_ranking(scores, totals)]
+        petitioner_ranking = [(p, s, t, round(rs, 1)) for p, s, t, rs in get_ranking(petitioner_scores,
+                                                                                        petitioner_totals)]
+        if writer is not None:
+            writer.writerows([respondent, p, "", s, t, rs] for p, s, t, rs in ranking)
+            writer.writerows([respondent, "", p, s, t, rs] for p, s, t, rs in petitioner_ranking)
+        else:
+            output.write(json.dumps({
+                "respondent": respondent,
+                "results": [{"party": p, "score": s, "total": t, "percentage": rs} for p, s, t, rs in ranking],
+                "petitioners": [{"petitioner": p, "score": s, "total": t, "percentage": rs}
+                                for p, s, t, rs in petitioner_ranking]
+            }) + "\n")
+
+
+def run_batch_scorer(input_path: str, output_path: str, format: str):
+    """ Run the batch scorer.
+
+    :param input_path: The path of the file with the answer sets (see read_answer_sets).
+    :param output_path: The path of the file to which the results are written or '-' to write them to the console.
+    :param format: The format of the results, either 'csv' or 'json'.
+    """
+    results = score_answer_sets(read_answer_sets(input_path))
+    if output_path == "-":
+        write_results(results, sys.stdout, format)
+        return
+
+    with open(output_path, "w", newline="") as f:
+        write_results(results, f, format)
@@ -0,0 +1,183 @@
+""" The DownloadMetrics record what the downloader spends its time on for every downloaded month: the OData requests
+(count, bytes and a latency histogram), fetching, parsing and why motions (Dutch: moties) are dropped while parsing. The
+metrics can be exported as a JSON report and as a Prometheus text file. """
+import bisect
+import json
+import os
+import threading
+from collections import Counter as counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+# The upper bounds in seconds of the buckets of the request latency histogram, the last bucket is unbounded.
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+
+# The label of the metrics that are recorded outside of a month, e.g. lazy lookups while storing.
+UNKNOWN_MONTH = "onbekend"
+
+
+def create_month_metrics() -> Dict[str, Any]:
+    """ Create the metrics of a single month, where everything is still zero. """
+    return {
+        "requests": 0,
+        "errors": 0,  # The number of requests that did not return HTTP status 200.
+        "retries": 0,  # The number of requests that retried a failed request.
+        "bytes": 0,
+        "latency_buckets": [0] * (len(LATENCY_BUCKETS) + 1),
+        "latency_seconds": 0.0,
+        "fetch_seconds": 0.0,
+        "motions": 0,  # The number of downloaded motions, before they are parsed.
+        "rows": 0,  # The number of motions that are parsed into a row.
+        "parse_seconds": 0.0,
+        "dropped": counter()
+    }
+
+
+class DownloadMetrics:
+    """ The metrics of a download run, which can be recorded by multiple threads at the same time. Every thread
+    records into the month that it is processing (see month). """
+
+    def __init__(self):
+        """ Create the metrics without any recorded values. """
+        self.months: Dict[str, Dict[str, Any]] = dict()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def reset(self):
+        """ Remove all recorded values. """
+        with self.lock:
+            self.months = dict()
+
+    @contextmanager
+    def month(self, year: str, month: str) -> Iterator[None]:
+        """ Record all metrics of the current thread into the given month while the context is active. """
+        self.local.month = f"{year}-{month}"
+        try:
+            yield
+        finally:
+            self.local.month = UNKNOWN_MONTH
+
+    def get_month_metrics(self) -> Dict[str, Any]:
+        """ Get the metrics of the month of the current thread, which must be called while holding the lock. """
+        label = getattr(self.local, "month", UNKNOWN_MONTH)
+        if label not in self.months:
+            self.months[label] = create_month_metrics()
+        return self.months[label]
+
+    def record_request(self, latency: float, size: int, status: int, attempt: int = 0):
+        """ Record an OData request.
+
+        :param latency: The time in seconds until the response was received.
+        :param size: The size of the response body in bytes.
+        :param status: The HTTP status code of the response or 0 if there was no response.
+        :param attempt: The number of the attempt of the request (0 for the first, see HttpClient.get).
+        """
+        with self.lock:
+            metrics = self.get_month_metrics()
+            metrics["requests"] += 1
+            metrics["errors"] += status != 200
+            metrics["retries"] += attempt > 0
+            metrics["bytes"] += size
+            metrics["latency_buckets"][bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+            metrics["latency_seconds"] += latency
+
+    def record_fetch(self, seconds: float, motions: int):
+        """ Record that all (paged) motions of the month are fetched.
+
+        :param seconds: The time in seconds that fetching took, including the requests of all pages.
+        :param motions: The number of fetched motions.
+        """
+        with self.lock:
+            metrics = self.get_month_metrics()
+            metrics["fetch_seconds"] += seconds
+            metrics["motions"] += motions
+
+    def record_parse(self, seconds: float, rows: int):
+        """ Record that the motions of the month are parsed.
+
+        :param seconds: The time in seconds that parsing took.
+        :param rows: The number of motions that are parsed into a row (and not dropped).
+        """
+        with self.lock:
+            metrics = self.get_month_metrics()
+            metrics["parse_seconds"] += seconds
+            metrics["rows"] += rows
+
+    def record_drop(self, reason: str):
+        """ Record that a motion is dropped while parsing.
+
+        :param reason: Why the motion is dropped, e.g. 'not_motion' or 'unknown_vote'.
+        """
+        with self.lock:
+            self.get_month_metrics()["dropped"][reason] += 1
+
+    def get_report(self) -> Dict[str, Any]:
+        """ Get the report of all recorded metrics.
+
+        :return: A dictionary with the latency bucket bounds (latency_buckets), the metrics of every month (months) and
+            the sum of the metrics of all months (total). Every month also contains its parse throughput in motions per
+            second (parse_throughput).
+        """
+        with self.lock:
+            months = {label: {**metrics, "dropped": dict(metrics["dropped"])} for label, metrics in self.months.items()}
+
+        total = create_month_metrics()
+        for metrics in months.values():
+            for key, value in metrics.items():
+                if key == "latency_buckets":
+                    total[key] = [t + v for t, v in zip(total[key], value)]
+                elif key == "dropped":
+                    total[key].update(value)
+                else:
+                    total[key] += value
+        total["dropped"] = dict(total["dropped"])
+
+        for metrics in [*months.values(), total]:
+            metrics["parse_throughput"] = metrics["motions"] / metrics["parse_seconds"] \
+                if metrics["parse_seconds"] > 0 else 0.0
+        return {"latency_buckets": LATENCY_BUCKETS, "months": months, "total": total}
+
+    def get_prometheus_text(self) -> str:
+        """ Get all recorded metrics in the Prometheus text exposition format, labelled by month. """
+        months = self.get_report()["months"]
+        lines: List[str] = []
+
+        def add_metric(name: str, type: str, help: str, key: str):
+            lines.extend([f"# HELP motiewijzer_download_{name} {help}", f"# TYPE motiewijzer_download_{name} {type}"])
+            lines.extend(f'motiewijzer_download_{name}{{month="{label}"}} {metrics[key]}'
+                         for label, metrics in months.items())
+
+        add_metric("requests_total", "counter", "The number of OData requests.", "requests")
+        add_metric("request_errors_total", "counter", "The number of OData requests without status 200.", "errors")
+        add_metric("request_retries_total", "counter", "The number of retried OData requests.", "retries")
+        add_metric("response_bytes_total", "counter", "The number of bytes of all OData responses.", "bytes")
+        add_metric("fetch_seconds_total", "counter", "The time spent on fetching the motions.", "fetch_seconds")
+        add_metric("motions_total", "counter", "The number of downloaded motions.", "motions")
+        add_metric("rows_total", "counter", "The number of motions that are parsed into a row.", "rows")
+        add_metric("parse_seconds_total", "counter", "The time spent on parsing the motions.", "parse_seconds")
+        add_metric("parse_throughput", "gauge", "The number of parsed motions per second.", "parse_throughput")
+
+        name = "motiewijzer_download_dropped_total"
+        lines.extend([f"# HELP {name} The number of motions that are dropped while parsing.", f"# TYPE {name} counter"])
+        lines.extend(f'{name}{{month="{label}",reason="{reason}"}} {count}'
+                     for label, metrics in months.items() for reason, count in sorted(metrics["dropped"].items()))
+
+        name = "motiewijzer_download_request_duration_seconds"
+        lines.extend([f"# HELP {name} The latency of the OData requests.", f"# TYPE {name} histogram"])
+        for label, metrics in months.items():
+            cumulative = 0
+            for bound, count in zip([*LATENCY_BUCKETS, "+Inf"], metrics["latency_buckets"]):
+                cumulative += count
+                lines.append(f'{name}_bucket{{month="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{month="{label}"}} {metrics["latency_seconds"]}')
+            lines.append(f'{name}_count{{month="{label}"}} {metrics["requests"]}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, json_path: str, prometheus_path: str):
+        """ Write the report (see get_report) into a JSON file and the metrics into a Prometheus text file. """
+        for path, text in [(json_path, json.dumps(self.get_report(), indent=2)),
+                           (prometheus_path, self.get_prometheus_text())]:
+            temporary_path = f"{path}.tmp"
+            with open(temporary_path, "w") as f:
+                f.write(text)
+            os.replace(temporary_path, path)
@@ -1,18 +1,76 @@
 """ The Downloader is responsible for downloading all motion (Dutch: motie) metadata in a given date range. """
+import json
 import os
-from datetime import date
-from typing import Any, Dict, List, Tuple
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Type
 
 from dateutil.relativedelta import relativedelta
 from progress.bar import Bar
 from pytz import timezone
 from tkapi import tkapi
 from tkapi.besluit import Besluit
+from tkapi.core import TKItem
+from tkapi.document import Document
 from tkapi.filter import Filter
-from tkapi.zaak import ZaakActorRelatieSoort, Zaak, ZaakSoort
+from tkapi.stemming import Stemming
+from tkapi.zaak import ZaakActor, ZaakActorRelatieSoort, Zaak, ZaakSoort
 import pandas as pd
 
-from MotieWijzer.Business import DATA_DIRECTORY, MOTIONS_DATA_PATH
+from MotieWijzer.Business import DATA_DIRECTORY, DOWNLOAD_METRICS_PATH, DOWNLOAD_REPORT_PATH, SYNC_STATE_PATH
+from MotieWijzer.Business.DownloadMetrics import DownloadMetrics
+from MotieWijzer.Business.HttpClient import client
+from MotieWijzer.Business.MonthStatistics import update_month_statistics
+from MotieWijzer.Business.MotionStore import compact_motions, upsert_motions
+from MotieWijzer.Business.PetitionerIndex import update_petitioner_index
+from MotieWijzer.Business.ODataFixtures import record_fixture
+
+
+class ExpandedBesluit(Besluit):
+    """ A Besluit that is retrieved together with its Stemming, Zaak, Document and ZaakActor data in a single OData
+    query, such that parsing it does not require any additional (lazy) requests. """
+    expand_params = ["Stemming", "Zaak($expand=Document,ZaakActor)"]
+
+
+class MeteredTKApi(tkapi.TKApi):
+    """ A TKApi that sends every OData request (including the requests of the next pages) through the shared HttpClient,
+    such that failed requests are retried, and records the latency, size and status of every attempt into the download
+    metrics. If record_directory is set then every response is also recorded as a fixture, which can be replayed
+    offline by the fixture server (see ODataFixtures). """
+    record_directory: Optional[str] = None
+
+    @classmethod
+    def _request_json(cls, url: str, params: Optional[Dict[str, Any]] = None, max_items: Optional[int] = None) -> \
+            Dict[str, Any]:
+        """ Request an OData response in the same way as TKApi does.
+
+        :return: The JSON response or an empty dictionary if the requested item does not exist.
+        """
+        url = url.strip()
+        params = dict(params) if params else dict()
+        if "$format" not in url:
+            params["$format"] = "application/json;odata.metadata=full"
+        if max_items is not None:
+            params["$top"] = max_items
+        if cls.api_root.strip().lower() not in url.lower():
+            url = cls.api_root + url
+
+        response = client.get(url, params, timeout=60, listener=metrics.record_request)
+        if cls.record_directory is not None:
+            record_fixture(cls.record_directory, cls.api_root, response.url, response.status_code, response.content)
+        if response.status_code in (204, 404):
+            return dict()
+        response.raise_for_status()  # The request still failed after all retries.
+        return response.json()
+
+
+metrics = DownloadMetrics()  # The metrics of the current download run.
+# How many months per worker are downloaded ahead of the month that is returned next, which bounds the number of parsed
+# months that are kept in memory.
+MONTHS_AHEAD_PER_WORKER = 2
 
 
 def init_data_directory():
@@ -35,37 +93,64 @@ def get_year_month_combinations(start_date: date, end_date: date) -> List[Tuple[
     return year_month_combinations
 
 
-def download_motions(year: str, month: str) -> List[Besluit]:
-    """ Download all motions using the TkApi for a given year and month.
+def download_motions(year: str, month: str, since: Optional[datetime] = None) -> List[Besluit]:
+    """ Download all motions using the TkApi for a given year and month. The Stemming, Zaak, Document and ZaakActor
+    data of the motions is expanded in the same (paged) query.
 
     :param year: The year for which the motions are downloaded.
     :param month: The month for which the motions are downloaded.
+    :param since: If given then only motions which are modified (Dutch: gewijzigd) after this time are downloaded.
     :return: A list of Besluit objects from the TkApi which represent the motions.
     """
-    api = tkapi.TKApi()
+    api = MeteredTKApi()
     filter = Filter()
     filter.add_filter_str("StemmingsSoort eq 'Met handopsteken'")
     filter.add_filter_str(f"year(GewijzigdOp) eq {str(year)}")
     filter.add_filter_str(f"month(GewijzigdOp) eq {str(month)}")
-    return api.get_besluiten(filter=filter)
+    if since is not None:
+        filter.add_filter_str(f"GewijzigdOp gt {since.isoformat()}")
 
+    start_time = time.perf_counter()
+    motions = api.get_items(ExpandedBesluit, filter=filter)
+    metrics.record_fetch(time.perf_counter() - start_time, len(motions))
+    return motions
 
-def parse_basic_info(motion: Besluit, zaak: Zaak) -> Dict[str, Any]:
+
+def get_expanded_items(item: TKItem, tkitem: Type[TKItem]) -> List[TKItem]:
+    """ Get the related items of a given type that were expanded into the OData response of an item.
+
+    :param item: The item of which the related items were expanded.
+    :param tkitem: The class of the related items, e.g. Zaak or Stemming.
+    :return: The related items that are not deleted, or an empty list if there are none.
+    """
+    related = item.json.get(tkitem.type)
+    if related is None:
+        return []
+    if isinstance(related, dict):
+        related = [related]
+    return [tkitem(related_item) for related_item in related if not related_item.get("Verwijderd", False)]
+
+
+def parse_basic_info(motion: Besluit, zaak: Zaak, documents: List[Document]) -> Dict[str, Any]:
     """ Parse the basic information for a motion (Dutch: motie), which are the Id, Subject, VoteTime, Url and Size.
 
     :param motion: The motion from which the basic information is extracted.
     :param zaak: The zaak object corresponding to the motion.
+    :param documents: The documents belonging to the zaak object.
     :return: This information parsed or an empty dictionary if it wasn't discussed in the Tweede Kamer, if it wasn't a
         motion, if there were no documents or if the motion was neither accepted (Dutch: aangenomen) or rejected
-        (Dutch: verworpen).
+        (Dutch: verworpen). The reason why a motion is dropped is recorded in the download metrics.
     """
     if zaak.get_property_or_none("Organisatie") != "Tweede Kamer":
+        metrics.record_drop("not_tweede_kamer")
         return dict()
 
     if zaak.soort != ZaakSoort.MOTIE:
+        metrics.record_drop("not_motion")
         return dict()
 
-    if len(zaak.documenten) == 0:
+    if len(documents) == 0:
+        metrics.record_drop("no_document")
         return dict()
 
     accepted = motion.tekst
@@ -74,9 +159,10 @@ def parse_basic_info(motion: Besluit, zaak: Zaak) -> Dict[str, Any]:
     elif accepted == "Verworpen.":
         accepted = False
     else:
+        metrics.record_drop("no_decision")
         return dict()
 
-    document = zaak.documenten[0]
+    document = documents[0]
     id = document.get_property_or_empty_string("Id")
     url = f"https://gegevensmagazijn.tweedekamer.nl/OData/v4/2.0/document/{id}/resource"
     size = int(document.get_property_or_empty_string("ContentLength"))
@@ -86,12 +172,13 @@ def parse_basic_info(motion: Besluit, zaak: Zaak) -> Dict[str, Any]:
     return {"Id": id, "Subject": zaak.onderwerp, "VoteTime": vote_time, "Url": url, "Size": size, "Accepted": accepted}
 
 
-def parse_vote_info(motion: Besluit) -> Dict[str, Any]:
+def parse_vote_info(votes: List[Stemming]) -> Dict[str, Any]:
     """ Parse voting info, which are how many members of the Tweede Kamer voted in favor, against and did not vote.
     Also parse which parties voted in favor, against and did not vote.
 
-    :param motion: The motion from which the basic information is extracted.
-    :return: The parsed voting data or empty if odd voting data is encountered.
+    :param votes: The votes (Dutch: stemmingen) of the motion from which the voting info is extracted.
+    :return: The parsed voting data or empty if odd voting data is encountered, which is recorded in the download
+        metrics.
     """
     num_proponents = 0
     proponents = []
@@ -100,7 +187,7 @@ def parse_vote_info(motion: Besluit) -> Dict[str, Any]:
     num_opponents = 0
     opponents = []
     error = False
-    for vote in motion.stemmingen:
+    for vote in votes:
         if vote.soort == "Voor":
             num_proponents += vote.fractie_size
             proponents += [vote.actor_fractie]
@@ -114,20 +201,23 @@ def parse_vote_info(motion: Besluit) -> Dict[str, Any]:
             error = True
             break
     if error:
+        metrics.record_drop("unknown_vote")
         return dict()
 
+    # A roll call vote has a vote for every member, so a party is listed once per column like in the party masks.
+    proponents, absentees, opponents = (list(dict.fromkeys(ps)) for ps in (proponents, absentees, opponents))
     return {"NumProponents": num_proponents, "Proponents": ",".join(proponents), "NumAbsentees": num_absentees,
             "Absentees": ",".join(absentees), "NumOpponents": num_opponents, "Opponents": ",".join(opponents)}
 
 
-def parse_petitioners_info(zaak: Zaak) -> Dict[str, Any]:
+def parse_petitioners_info(actors: List[ZaakActor]) -> Dict[str, Any]:
     """ Parse the info about the petitioners (Dutch: indieners) of the motion (Dutch: motie).
 
-    :param zaak: The zaak object corresponding to the motion.
+    :param actors: The actors of the zaak object corresponding to the motion.
     :return: The parsed petitioners data.
     """
     petitioners = []
-    for actor in zaak.actors:
+    for actor in actors:
         relatie = actor.relatie
         if relatie == ZaakActorRelatieSoort.INDIENER or relatie == ZaakActorRelatieSoort.MEDEINDIENER:
             petitioner = actor.naam
@@ -141,9 +231,9 @@ def parse_petitioners_info(zaak: Zaak) -> Dict[str, Any]:
 
 def parse_motion(motion: Besluit) -> Dict[str, Any]:
     """ Parse the data for a single motion (Dutch: motie) into a Dictionary mapping the column names to their
-    respective values.
+    respective values. All related data is read from the expanded OData response, so no additional requests are made.
 
-    :param motion: A single motion (Dutch: motie).
+    :param motion: A single motion (Dutch: motie) retrieved as ExpandedBesluit.
     :return: A dictionary mapping the following column names to the following values:
         - Id: The id of the document of the motion.
         - Subject: The subject of the motion.
@@ -160,42 +250,224 @@ def parse_motion(motion: Besluit) -> Dict[str, Any]:
         - Petitions (Dutch: Indieners): The members of the Tweede Kamer that submitted the vote, which is formatted by
             $member_name ($party_name),$member_name_2 ($party_name_2),...
     """
-    zaak = motion.zaak
-    basic_info = parse_basic_info(motion, zaak)
+    zaken = get_expanded_items(motion, Zaak)
+    if not zaken:
+        metrics.record_drop("no_zaak")
+        return dict()
+
+    zaak = zaken[0]
+    basic_info = parse_basic_info(motion, zaak, get_expanded_items(zaak, Document))
     if not basic_info:
         return dict()
 
-    vote_info = parse_vote_info(motion)
+    vote_info = parse_vote_info(get_expanded_items(motion, Stemming))
     if not vote_info:
         return dict()
 
-    petitioners_info = parse_petitioners_info(zaak)
+    petitioners_info = parse_petitioners_info(get_expanded_items(zaak, ZaakActor))
     return {**basic_info, **vote_info, **petitioners_info}
 
 
-def run_downloader(start_date: date, end_date: date):
-    """ Run the downloader. """
+def parse_month(year: str, month: str, show_progress: bool = True, since: Optional[datetime] = None) -> \
+    Tuple[List[Dict[str, Any]], Optional[datetime]]:
+    """ Download and parse all motions (Dutch: moties) for a given year and month.
+
+    :param year: The year for which the motions are downloaded.
+    :param month: The month for which the motions are downloaded.
+    :param show_progress: If true then a progress bar is shown while parsing the motions of this month.
+    :param since: If given then only motions which are modified after this time are downloaded.
+    :return: The parsed rows of all motions in this month that were not rejected while parsing and the last
+        modification time (Dutch: GewijzigdOp) of all downloaded motions, which is None if there were no motions.
+    """
     rows = []
-    init_data_directory()
-    year_month_combinations = get_year_month_combinations(start_date, end_date)
-    for year, month in year_month_combinations:
-        motions = download_motions(year, month)
+    with metrics.month(year, month):
+        motions = download_motions(year, month, since)
         if not motions:
-            continue
-        progress_bar = Bar(f"Moties voor {year}-{month} geparsed: ", max=len(motions))
-        progress_bar.start()
+            return rows, None
+
+        progress_bar = Bar(f"Moties voor {year}-{month} geparsed: ", max=len(motions)) if show_progress else None
+        if progress_bar is not None:
+            progress_bar.start()
+        start_time = time.perf_counter()
         for motion in motions:
             row = parse_motion(motion)
             if row:
                 rows.append(row)
-            progress_bar.next()
-        progress_bar.finish()
-    new_data = pd.DataFrame(rows)
+            if progress_bar is not None:
+                progress_bar.next()
+        metrics.record_parse(time.perf_counter() - start_time, len(rows))
+        if progress_bar is not None:
+            progress_bar.finish()
+
+    watermark = max((m.gewijzigd_op for m in motions if m.gewijzigd_op is not None), default=None)
+    return rows, watermark
+
+
+def iterate_months(year_month_combinations: List[Tuple[str, str]], workers: int, since: Optional[datetime] = None) -> \
+    Iterator[Tuple[int, List[Dict[str, Any]], Optional[datetime]]]:
+    """ Download and parse the given months, either one month at a time or multiple months at once with a pool of
+    worker threads.
+
+    :param year_month_combinations: The year month combinations for which all motions are downloaded.
+    :param workers: The number of months that are downloaded and parsed at the same time.
+    :param since: If given then only motions which are modified after this time are downloaded.
+    :return: For every month in order the index of the month in year_month_combinations, the parsed rows and the last
+        modification time of the motions in this month. The months are returned in order also with multiple workers,
+        such that a motion that is parsed in multiple months is always stored with the row of the latest month.
+    """
+    if workers <= 1:
+        for index, (year, month) in enumerate(year_month_combinations):
+            yield index, *parse_month(year, month, True, since)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Only a window of months is submitted ahead, so only the rows of the months in the window are kept in memory
+        # and a month is dropped as soon as it is returned.
+        months = iter(enumerate(year_month_combinations))
+        pending = deque((index, executor.submit(parse_month, year, month, False, since))
+                        for index, (year, month) in islice(months, workers * MONTHS_AHEAD_PER_WORKER))
+        while pending:
+            index, future = pending.popleft()
+            rows, watermark = future.result()
+            for next_index, (year, month) in islice(months, 1):
+                pending.append((next_index, executor.submit(parse_month, year, month, False, since)))
+            year, month = year_month_combinations[index]
+            print(f"Moties voor {year}-{month} geparsed: {len(rows)}")
+            yield index, rows, watermark
+
+
+def store_rows(rows: List[Dict[str, Any]], compact: bool = True):
+    """ Store parsed motion rows, which replace the already stored motions with the same Id. Only the given rows are
+    written (see upsert_motions), so the cost does not depend on the number of already stored motions.
+
+    :param rows: The parsed motion rows that are stored.
+    :param compact: If true then the motion store is compacted afterwards if it consists of too many segments and the
+        statistics per month and the petitioner index of the changed shards are updated.
+    """
+    if rows:
+        upsert_motions(pd.DataFrame(rows))
+    if compact:
+        compact_motions()
+        update_month_statistics()
+        update_petitioner_index()
+
+
+def load_sync_state() -> Dict[str, Any]:
+    """ Load the state of the incremental downloader.
+
+    :return: A dictionary with the following keys:
+        - watermark: The last modification time (Dutch: GewijzigdOp) of all processed motions in ISO format or None if
+            no motions have been processed yet.
+        - run: The unfinished run or None if the last run was finished. A run contains the watermark from which it
+            downloads (since), all months it downloads (months) and the months that are finished (completed).
+    """
+    if not os.path.isfile(SYNC_STATE_PATH):
+        return {"watermark": None, "run": None}
+
+    with open(SYNC_STATE_PATH, "r") as f:
+        return json.load(f)
+
+
+def save_sync_state(state: Dict[str, Any]):
+    """ Save the state of the incremental downloader, which is used as checkpoint after each month.
+
+    :param state: The state of the incremental downloader as described in load_sync_state.
+    """
+    temporary_path = f"{SYNC_STATE_PATH}.tmp"
+    with open(temporary_path, "w") as f:
+        json.dump(state, f)
+    os.replace(temporary_path, SYNC_STATE_PATH)
+
+
+def run_incremental_downloader(start_date: date, end_date: date, workers: int):
+    """ Run the downloader incrementally, which only downloads motions that are modified since the last processed
+    modification time and which stores the results after each month, such that an interrupted run can be resumed.
 
-    if os.path.isfile(MOTIONS_DATA_PATH):
-        old_data = pd.read_csv(MOTIONS_DATA_PATH, sep="|")
-        old_data = old_data[~old_data["Id"].isin(new_data["Id"])]
-        new_data = pd.concat([old_data, new_data])
+    :param start_date: The first month for which motions are downloaded. Every run requests the whole range, because
+        only the filter on the modification time keeps a run small, such that motions of earlier months that are
+        modified after the watermark (e.g. corrections) are also downloaded again.
+    :param end_date: The last month for which motions are downloaded.
+    :param workers: The number of months that are downloaded and parsed at the same time.
 
-    new_data.to_csv(MOTIONS_DATA_PATH, sep="|", index=False)
+    An interrupted run is only resumed if it downloads the same months, otherwise a new run is started for the given
+    months. The new run downloads from the watermark of the interrupted run, because the watermark already moved past
+    the motions of the months that the interrupted run did not finish.
+    """
+    state = load_sync_state()
+    run = state["run"]
+    months = [f"{year}-{month}" for year, month in get_year_month_combinations(start_date, end_date)]
+    if run is not None and run["months"] != months:
+        period = " t/m ".join(run["months"][:1] + run["months"][-1:])
+        print(f"De onderbroken download was voor een andere periode ({period}), daarom wordt een nieuwe download "
+              f"gestart voor de gegeven periode.")
+        run = {"since": run["since"], "months": months, "completed": []}
+        state["run"] = run
+        save_sync_state(state)
+    elif run is None:
+        run = {"since": state["watermark"], "months": months, "completed": []}
+        state["run"] = run
+        save_sync_state(state)
+    else:
+        print("Een onderbroken download wordt hervat.")
+
+    # Every month is stored as soon as it is parsed, but the store is compacted and the statistics and the petitioner
+    # index are updated once at the end (also when an interrupted run is resumed), instead of after every month.
+    year_month_combinations = [tuple(m.split("-")) for m in run["months"] if m not in run["completed"]]
+    since = None if run["since"] is None else datetime.fromisoformat(run["since"])
+    for index, rows, watermark in iterate_months(year_month_combinations, workers, since):
+        store_rows(rows, compact=False)
+        year, month = year_month_combinations[index]
+        run["completed"].append(f"{year}-{month}")
+        if watermark is not None and \
+                (state["watermark"] is None or watermark > datetime.fromisoformat(state["watermark"])):
+            state["watermark"] = watermark.isoformat()
+        save_sync_state(state)
+    compact_motions()
+    update_month_statistics()
+    update_petitioner_index()
+
+    state["run"] = None
+    save_sync_state(state)
     print("Het downloaden van motie metadata is gelukt.")
+
+
+def run_downloader(start_date: date, end_date: date, workers: int = 1, incremental: bool = False,
+                   api_root: Optional[str] = None, record_directory: Optional[str] = None):
+    """ Run the downloader.
+
+    :param start_date: The first month for which motions are downloaded.
+    :param end_date: The last month for which motions are downloaded.
+    :param workers: The number of months that are downloaded and parsed at the same time.
+    :param incremental: If true then only motions that are modified since the previous incremental run are
+        downloaded and the results are stored after each month (see run_incremental_downloader).
+    :param api_root: The root of the OData API from which the motions are downloaded, e.g. the address of a fixture
+        server, or None for the API of the Tweede Kamer.
+    :param record_directory: If given then all OData responses are recorded as fixtures in this directory.
+
+    The metrics of the run are exported to DOWNLOAD_REPORT_PATH (JSON) and DOWNLOAD_METRICS_PATH (Prometheus).
+    """
+    init_data_directory()
+    metrics.reset()
+    client.reset_statistics()
+    MeteredTKApi.api_root = tkapi.TKApi.api_root if api_root is None else api_root
+    MeteredTKApi.record_directory = record_directory
+    try:
+        if incremental:
+            run_incremental_downloader(start_date, end_date, workers)
+            return
+
+        # Every month is stored as soon as it is parsed, such that only the rows of the months that are being parsed are
+        # kept in memory. The store is compacted at most once at the end, instead of after every month.
+        for _, rows, _ in iterate_months(get_year_month_combinations(start_date, end_date), workers):
+            store_rows(rows, compact=False)
+        compact_motions()
+        update_month_statistics()
+        update_petitioner_index()
+        print("Het downloaden van motie metadata is gelukt.")
+    finally:
+        # The metrics are also exported if the download is interrupted, because they show why it was slow.
+        metrics.export(DOWNLOAD_REPORT_PATH, DOWNLOAD_METRICS_PATH)
+        total = metrics.get_report()["total"]
+        dropped = ", ".join(f"{reason} ({count})" for reason, count in sorted(total["dropped"].items()))
+        print(f"{client.get_summary()} Gedropte moties: {dropped if dropped else 'geen'}. Zie {DOWNLOAD_REPORT_PATH} "
+              f"voor alle metrics.")
@@ -0,0 +1,185 @@
+""" The HttpClient is the shared HTTP layer of the downloader and the runner. It keeps connections to the Tweede Kamer
+API alive in a pool, retries failed requests (timeouts, connection errors, 429 and 5xx responses) with a jittered
+exponential backoff and limits the number of concurrent requests adaptively: the limit is halved when the API signals
+that it is overloaded and slowly increased again while requests succeed (additive increase, multiplicative decrease). It
+also keeps statistics about the throughput and the retries. """
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}  # The HTTP status codes of responses that are retried.
+MAX_RETRIES = 5  # The maximum number of times a request is retried before it fails.
+BASE_BACKOFF = 0.5  # The backoff in seconds before the first retry, which doubles for every next retry.
+MAX_BACKOFF = 30.0  # The maximum backoff in seconds before a retry.
+MAX_CONCURRENCY = 16  # The maximum (and initial) number of requests that are sent at the same time.
+MIN_CONCURRENCY = 1  # The minimum number of requests that are sent at the same time.
+DECREASE_INTERVAL = 1.0  # The minimum number of seconds between two decreases of the concurrency limit.
+
+
+class ConcurrencyLimiter:
+    """ Limits the number of concurrent requests, shared by multiple threads. The limit is halved when a request is
+    congested (429 or 5xx) and increased by one after `limit` successful requests. """
+
+    def __init__(self, max_limit: int = MAX_CONCURRENCY, min_limit: int = MIN_CONCURRENCY):
+        """ Create the limiter.
+
+        :param max_limit: The maximum (and initial) number of concurrent requests.
+        :param min_limit: The minimum number of concurrent requests.
+        """
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(max_limit)
+        self.active = 0
+        self.last_decrease = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """ Wait until another request is allowed to start. """
+        with self.condition:
+            while self.active >= int(self.limit):
+                self.condition.wait()
+            self.active += 1
+
+    def release(self, congested: bool):
+        """ Mark a request as finished and adapt the limit.
+
+        :param congested: True if the API signalled that it is overloaded, e.g. with a 429 or 5xx response.
+        """
+        with self.condition:
+            self.active -= 1
+            now = time.monotonic()
+            if congested:
+                # The requests that were already in flight are likely congested as well, so they only count once.
+                if now - self.last_decrease >= DECREASE_INTERVAL:
+                    self.limit = max(self.limit / 2, self.min_limit)
+                    self.last_decrease = now
+            else:
+                self.limit = min(self.limit + 1 / self.limit, self.max_limit)
+            self.condition.notify_all()
+
+
+class HttpClient:
+    """ A thread-safe HTTP client with a connection pool, retries and an adaptive concurrency limit. """
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY, max_retries: int = MAX_RETRIES):
+        """ Create the client.
+
+        :param max_concurrency: The maximum number of requests that are sent at the same time, which is also the
+            number of connections that are kept alive per host.
+        :param max_retries: The maximum number of times a request is retried before it fails.
+        """
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.limiter = ConcurrencyLimiter(max_concurrency)
+        self.max_retries = max_retries
+        self.lock = threading.Lock()
+        self.reset_statistics()
+
+    def reset_statistics(self):
+        """ Remove all statistics that were kept so far. """
+        with self.lock:
+            self.statistics = {"requests": 0, "retries": 0, "failures": 0, "congested": 0, "connection_errors": 0,
+                               "bytes": 0, "request_seconds": 0.0}
+            self.start_time: Optional[float] = None
+
+    def record(self, latency: float, size: int, status: int, retry: bool):
+        """ Record a single attempt of a request in the statistics. """
+        with self.lock:
+            if self.start_time is None:
+                self.start_time = time.perf_counter() - latency
+            self.statistics["requests"] += 1
+            self.statistics["retries"] += retry
+            self.statistics["congested"] += status in RETRY_STATUSES
+            self.statistics["connection_errors"] += status == 0
+            self.statistics["bytes"] += size
+            self.statistics["request_seconds"] += latency
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None, timeout: float = 60,
+            listener: Optional[Callable[[float, int, int, int], None]] = None) -> requests.Response:
+        """ Send a GET request, which is retried if it times out, the connection fails or the response has one of the
+        RETRY_STATUSES. The backoff before a retry is drawn uniformly between zero and an exponentially growing maximum
+        (full jitter), unless the response contains a Retry-After header in seconds.
+
+        :param url: The requested url.
+        :param params: The query parameters of the request.
+        :param timeout: The maximum number of seconds to wait for the server.
+        :param listener: Is called after every attempt with the latency in seconds, the size of the response body in
+            bytes, the HTTP status code (0 if there is no response) and the number of the attempt (0 for the first).
+        :return: The response of the last attempt, which can still have one of the RETRY_STATUSES if all retries
+            failed.
+        :raises requests.RequestException: If the connection failed or timed out during the last attempt.
+        """
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            response, error = None, None
+            start_time = time.perf_counter()
+            try:
+                response = self.session.get(url=url, params=params, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            finally:
+                status = 0 if response is None else response.status_code
+                self.limiter.release(status == 0 or status in RETRY_STATUSES)
+            latency = time.perf_counter() - start_time
+            size = 0 if response is None else len(response.content)
+            self.record(latency, size, status, attempt > 0)
+            if listener is not None:
+                listener(latency, size, status, attempt)
+
+            if status != 0 and status not in RETRY_STATUSES:
+                return response
+            if attempt >= self.max_retries:
+                with self.lock:
+                    self.statistics["failures"] += 1
+                if error is not None:
+                    raise error
+                return response
+            time.sleep(self.get_backoff(attempt, response))
+            attempt += 1
+
+    @staticmethod
+    def get_backoff(attempt: int, response: Optional[requests.Response]) -> float:
+        """ Get the number of seconds to wait before the next attempt of a request.
+
+        :param attempt: The number of the attempt that failed (0 for the first).
+        :param response: The response of the failed attempt or None if there was no response.
+        """
+        retry_after = None if response is None else response.headers.get("Retry-After", "")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), MAX_BACKOFF)
+        return random.uniform(0.0, min(BASE_BACKOFF * 2 ** attempt, MAX_BACKOFF))
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """ Get the statistics of all requests since the statistics were reset.
+
+        :return: A dictionary with the number of attempts (requests), retried attempts (retries), requests that failed
+            after all retries (failures), 429 and 5xx responses (congested), timeouts and connection errors
+            (connection_errors), the downloaded bytes (bytes), the summed latency of all attempts (request_seconds),
+            the time since the first attempt started (seconds), the attempts and bytes per second of that time
+            (throughput and bytes_per_second) and the current concurrency limit (concurrency_limit).
+        """
+        with self.lock:
+            statistics = dict(self.statistics)
+            seconds = 0.0 if self.start_time is None else time.perf_counter() - self.start_time
+        statistics["seconds"] = seconds
+        statistics["throughput"] = statistics["requests"] / seconds if seconds > 0 else 0.0
+        statistics["bytes_per_second"] = statistics["bytes"] / seconds if seconds > 0 else 0.0
+        statistics["concurrency_limit"] = int(self.limiter.limit)
+        return statistics
+
+    def get_summary(self) -> str:
+        """ Get a single line (in Dutch) that summarizes the statistics for the user. """
+        statistics = self.get_statistics()
+        return f"Aantal requests: {statistics['requests']} ({statistics['throughput']:.1f} per seconde), " \
+               f"gedownload: {statistics['bytes'] / 1024 / 1024:.1f} MB, herhaald: {statistics['retries']}, " \
+               f"mislukt: {statistics['failures']}."
+
+
+client = HttpClient()  # The client that is shared by all requests to the Tweede Kamer API.
@@ -1,65 +1,122 @@
 from collections import Counter as counter
-from datetime import date
-from typing import List, Tuple
+from datetime import date, timedelta
+import hashlib
+import json
+import os
+from typing import List, Optional, Tuple
 
-import pandas as pd
+import numpy as np
 from pandas import DataFrame
 
-from MotieWijzer.Business import MOTIONS_DATA_PATH
+from MotieWijzer.Business import FILTER_CACHE_DIRECTORY, SEARCH_INDEX_PATH
+from MotieWijzer.Business.MonthStatistics import get_period_statistics
+from MotieWijzer.Business.MotionStore import get_version, load_motions
+from MotieWijzer.Business.PartyMasks import count_party_members, get_existing_masks, get_party_masks, get_party_names
+from MotieWijzer.Business.SearchIndex import search
 
-def filter_motions(motions: DataFrame, start_date: date, end_date: date, regex: str):
-    """ Filter the motions on date and the title on regex and to have at least any opponent. """
-    motions["VoteTime"] = pd.to_datetime(motions["VoteTime"].str.slice(0, 10))
-    return motions[
+# The columns that are needed to filter motions and to retrieve info about them. The parties are retrieved from the
+# party masks, so the party columns are not loaded.
+INFO_COLUMNS = ["Id", "Subject", "VoteTime", "NumOpponents"]
+
+
+def filter_motions(motions: DataFrame, start_date: date, end_date: date, regex: str, query: str = ""):
+    """ Filter the motions on date and the title on regex and to have at least any opponent. If a query is given then
+    the motions are also filtered on their PDF text matching the query in the search index. """
+    selection = (
         motions["Subject"].str.match(regex, case=False) &
         (motions["VoteTime"] >= start_date) &
-        (motions["VoteTime"] <= end_date) &
+        (motions["VoteTime"] < end_date + timedelta(days=1)) &
         (motions["NumOpponents"] > 0)
-    ]
+    )
+    if query:
+        selection &= motions["Id"].isin(search(query))
+    return motions[selection]
 
 
-def get_all_parties(motions: DataFrame) -> List[str]:
-    """ Get all parties that existed during any of the motions. """
-    motions["Proponents"] = motions["Proponents"].astype(str)
-    motions["Absentees"] = motions["Absentees"].astype(str)
-    motions["Opponents"] = motions["Opponents"].astype(str)
+def get_filter_key(start_date: date, end_date: date, regex: str, query: str) -> str:
+    """ Get the key under which results of a filter are cached. The key depends on the version of the motion store (and
+    of the search index if a query is used), so results of older versions are never used. """
+    search_version = os.stat(SEARCH_INDEX_PATH).st_mtime_ns if query and os.path.isfile(SEARCH_INDEX_PATH) else 0
+    key = json.dumps([get_version(), search_version, start_date.isoformat(), end_date.isoformat(), regex, query])
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def get_filter_cache_path(start_date: date, end_date: date, regex: str, query: str) -> str:
+    """ Get the path in which the result of a filter is cached (see get_filter_key). """
+    return f"{FILTER_CACHE_DIRECTORY}/{get_filter_key(start_date, end_date, regex, query)}.npy"
+
+
+def load_filtered_motions(start_date: date, end_date: date, regex: str, query: str = "",
+                          columns: Optional[List[str]] = None) -> DataFrame:
+    """ Load the motions and filter them (see filter_motions). Which motions are selected by the filter is cached,
+    such that loading the same selection again does not require filtering the motions again.
 
-    all_parties = set()
-    for _, row in motions.iterrows():
-        all_parties |= set(row["Proponents"].split(","))
-        all_parties |= set(row["Absentees"].split(","))
-        all_parties |= set(row["Opponents"].split(","))
-    return sorted(all_parties - {"nan"})
+    :param columns: The columns that are returned or None if all columns are returned.
+    :return: The filtered motions, which have the index under which they are stored.
+    """
+    # Only the shards of the motion store that overlap the dates are read.
+    motions = load_motions(None if columns is None else list(dict.fromkeys(columns + INFO_COLUMNS)), start_date,
+                           end_date)
+    path = get_filter_cache_path(start_date, end_date, regex, query)
+    if os.path.isfile(path):
+        motions = motions.loc[np.load(path)]
+    else:
+        motions = filter_motions(motions, start_date, end_date, regex, query)
+        os.makedirs(FILTER_CACHE_DIRECTORY, exist_ok=True)
+        np.save(path, motions.index.to_numpy())
+    return motions if columns is None else motions[columns]
+
+
+def get_all_parties(motions: DataFrame) -> List[str]:
+    """ Get all parties that existed during any of the motions, ordered by name. """
+    masks, dictionary = get_party_masks(motions)
+    return get_party_names(np.bitwise_or.reduce(get_existing_masks(masks), axis=0), dictionary)
 
 
 def get_partially_missing_parties(motions: DataFrame, all_parties: List[str]) -> List[Tuple[str, int]]:
     """ Get all parties that did not exist during any of these motions. """
+    masks, dictionary = get_party_masks(motions)
+    missing_counts = len(motions) - count_party_members(get_existing_masks(masks), len(dictionary))
     all_parties = set(all_parties)
-    partially_missing_parties = counter()
-    for _, row in motions.iterrows():
-        existing_parties = set()
-        existing_parties |= set(row["Proponents"].split(","))
-        existing_parties |= set(row["Absentees"].split(","))
-        existing_parties |= set(row["Opponents"].split(","))
-        partially_missing_parties.update(all_parties - existing_parties)
-
+    partially_missing_parties = counter({p: int(c) for p, c in sorted(zip(dictionary, missing_counts))
+                                         if p in all_parties and c > 0})
     return partially_missing_parties.most_common()
 
 
-def retrieve_info(start_date: date, end_date: date, regex: str):
-    """ Run the info retriever. """
-    motions = pd.read_csv(MOTIONS_DATA_PATH, sep="|")
-    motions = filter_motions(motions, start_date, end_date, regex)
+def get_period_info(start_date: date, end_date: date) -> Tuple[Optional[date], Optional[date], int, List[str],
+                                                                 List[Tuple[str, int]]]:
+    """ Get the info about all motions between the start date and the end date (inclusive) from the materialized
+    statistics per month (see get_period_statistics), which gives the same info as retrieve_info with regex '.*'.
+
+    :return: The first and last date, the number of motions, all parties (see get_all_parties) and the partially
+        missing parties (see get_partially_missing_parties).
+    """
+    statistics = get_period_statistics(start_date, end_date)
+    first_date = None if statistics["first"] is None else date.fromisoformat(statistics["first"][:10])
+    last_date = None if statistics["last"] is None else date.fromisoformat(statistics["last"][:10])
+    missing_counts = {p: statistics["motions"] - c["existing"] for p, c in sorted(statistics["parties"].items())}
+    partially_missing_parties = counter({p: c for p, c in missing_counts.items() if c > 0})
+    return first_date, last_date, statistics["motions"], sorted(statistics["parties"]), \
+        partially_missing_parties.most_common()
+
 
-    first_date = motions["VoteTime"].min().date()
-    last_date = motions["VoteTime"].max().date()
-    all_parties = get_all_parties(motions)
-    partially_missing_parties = get_partially_missing_parties(motions, all_parties)
+def retrieve_info(start_date: date, end_date: date, regex: str, query: str = ""):
+    """ Run the info retriever. Without a narrower filter than the default regex the info is retrieved from the
+    materialized statistics per month, otherwise the filtered motions are scanned. """
+    if regex == ".*" and not query:
+        first_date, last_date, count, all_parties, partially_missing_parties = get_period_info(start_date, end_date)
+    else:
+        motions = load_filtered_motions(start_date, end_date, regex, query, INFO_COLUMNS)
+        first_date = motions["VoteTime"].min().date()
+        last_date = motions["VoteTime"].max().date()
+        count = len(motions)
+        all_parties = get_all_parties(motions)
+        partially_missing_parties = get_partially_missing_parties(motions, all_parties)
     partially_missing_parties = [f"{p} ({c})" for p, c in partially_missing_parties]
     print()
     print(f"Eerste motie: {first_date}")
     print(f"Laatste motie: {last_date}")
-    print(f"Aantal moties: {len(motions)}")
+    print(f"Aantal moties: {count}")
     print(f"Alle partijen: {', '.join(all_parties)}")
     print(f"(Deels) ontbrekende partijen: {', '.join(partially_missing_parties)}")
     print()
@@ -0,0 +1,123 @@
+""" The MonthStatistics are materialized aggregates of the motions (Dutch: moties) per month: the number of motions,
+the first and last vote and for every party on how many motions it existed and how it voted. Like filter_motions only
+motions with at least one opponent are counted. The statistics are stored per shard of the motion store and only the
+shards of which the segments changed are computed again, so after a download only the touched years are aggregated.
+
+The info about all motions in a date range follows from summing the statistics of the months in the range. Only the
+months that are partially in the range are scanned. """
+import json
+import os
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List
+
+import numpy as np
+from pandas import DataFrame
+
+from MotieWijzer.Business import MONTH_STATISTICS_PATH
+from MotieWijzer.Business.MotionStore import PARTY_COLUMNS, combine_segments, get_shard_signature, group_segments, \
+    load_manifest, load_motions, read_segment
+from MotieWijzer.Business.PartyMasks import count_party_members, get_existing_masks, get_party_masks, load_party_masks
+
+# The columns of the motions that are aggregated.
+STATISTICS_COLUMNS = ["VoteTime", "NumOpponents"]
+
+
+def compute_month_statistics(motions: DataFrame, masks: np.ndarray, dictionary: List[str]) -> Dict[str, Any]:
+    """ Compute the statistics of every month in which any of the motions was voted on.
+
+    :param motions: The motions with at least the STATISTICS_COLUMNS.
+    :param masks: The party masks of the motions in the same order (see get_party_masks).
+    :param dictionary: The global party dictionary of the masks.
+    :return: For every month (YYYY-MM) the number of motions (motions), the first and last VoteTime in ISO format
+        (first and last) and for every party that existed during any of the motions (parties) on how many motions it
+        existed (existing) and how many times it is in each of the PARTY_COLUMNS.
+    """
+    selection = (motions["NumOpponents"] > 0).to_numpy()
+    motions, masks = motions[selection], masks[:, selection]
+    months = (motions["VoteTime"].dt.year * 100 + motions["VoteTime"].dt.month).to_numpy()  # Faster than strftime.
+    statistics = dict()
+    for month, positions in motions.groupby(months).indices.items():
+        month_masks = masks[:, positions]
+        vote_times = motions["VoteTime"].iloc[positions]
+        counts = {"existing": count_party_members(get_existing_masks(month_masks), len(dictionary))}
+        counts.update((c, count_party_members(m, len(dictionary))) for c, m in zip(PARTY_COLUMNS, month_masks))
+        statistics[f"{month // 100}-{month % 100:02d}"] = {
+            "motions": len(positions),
+            "first": vote_times.min().isoformat(),
+            "last": vote_times.max().isoformat(),
+            "parties": {p: {c: int(counts[c][i]) for c in counts}
+                        for i, p in enumerate(dictionary) if counts["existing"][i] > 0}
+        }
+    return statistics
+
+
+def merge_statistics(statistics: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """ Merge the statistics of multiple months into the statistics of all their motions (see
+    compute_month_statistics), where first and last are None if there are no motions. """
+    merged = {"motions": 0, "first": None, "last": None, "parties": dict()}
+    for month in statistics:
+        if month["motions"] == 0:
+            continue
+        merged["motions"] += month["motions"]
+        merged["first"] = month["first"] if merged["first"] is None else min(merged["first"], month["first"])
+        merged["last"] = month["last"] if merged["last"] is None else max(merged["last"], month["last"])
+        for party, counts in month["parties"].items():
+            party_counts = merged["parties"].setdefault(party, dict.fromkeys(counts, 0))
+            for column, count in counts.items():
+                party_counts[column] += count
+    return merged
+
+
+def update_month_statistics() -> Dict[str, Dict[str, Any]]:
+    """ Update the stored statistics of the shards of the motion store of which the segments changed.
+
+    :return: The statistics of every month (see compute_month_statistics).
+    """
+    stored = {"shards": dict()}
+    if os.path.isfile(MONTH_STATISTICS_PATH):
+        with open(MONTH_STATISTICS_PATH, "r") as f:
+            stored = json.load(f)
+
+    statistics = {"shards": dict()}
+    for shard, segments in group_segments(load_manifest()).items():
+        signature = get_shard_signature(segments)
+        if shard in stored["shards"] and stored["shards"][shard]["segments"] == signature:
+            statistics["shards"][shard] = stored["shards"][shard]
+            continue
+
+        motions = combine_segments([read_segment(segment, STATISTICS_COLUMNS) for segment in segments])
+        months = compute_month_statistics(motions, *load_party_masks(segments))
+        statistics["shards"][shard] = {"segments": signature, "months": months}
+
+    if statistics != stored:
+        temporary_path = f"{MONTH_STATISTICS_PATH}.tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(statistics, f)
+        os.replace(temporary_path, MONTH_STATISTICS_PATH)
+    return {month: s for shard in statistics["shards"].values() for month, s in shard["months"].items()}
+
+
+def scan_statistics(start_date: date, end_date: date) -> Dict[str, Any]:
+    """ Compute the statistics of all motions between the start date and the end date (inclusive) by scanning them. """
+    motions = load_motions(STATISTICS_COLUMNS, start_date, end_date)
+    motions = motions[(motions["VoteTime"] >= start_date) & (motions["VoteTime"] < end_date + timedelta(days=1))]
+    return merge_statistics(list(compute_month_statistics(motions, *get_party_masks(motions)).values()))
+
+
+def get_period_statistics(start_date: datetime, end_date: datetime) -> Dict[str, Any]:
+    """ Get the statistics of all motions between the start date and the end date (inclusive), which sums the stored
+    statistics of the months that are completely in the period and scans the motions of the other months.
+
+    :return: The merged statistics (see merge_statistics).
+    """
+    months = update_month_statistics()
+    first_month, last_month = f"{start_date:%Y-%m}", f"{end_date:%Y-%m}"
+    statistics = [s for month, s in months.items() if first_month < month < last_month]
+    for month in sorted({first_month, last_month}):
+        month_start = datetime.strptime(month, "%Y-%m")
+        month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        if start_date <= month_start and month_end <= end_date:
+            statistics += [months[month]] if month in months else []
+        else:
+            statistics.append(scan_statistics(max(start_date, month_start), min(end_date, month_end)))
+    return merge_statistics(statistics)
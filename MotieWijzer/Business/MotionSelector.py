@@ -0,0 +1,77 @@
+""" The MotionSelector picks the motion (Dutch: motie) that best separates the parties that are currently the closest
+to each other in the ranking, such that a stable ranking is reached with fewer motions. """
+from typing import Counter, List, Optional
+
+import numpy as np
+
+from MotieWijzer.Business.PartyMasks import get_party_votes
+
+GAP_SMOOTHING = 0.01  # Prevents that parties with exactly the same relative score get an infinite weight.
+
+
+def get_separations(masks: np.ndarray, dictionary: List[str], included_parties: List[str], scores: Counter[str],
+                    totals: Counter[str]) -> np.ndarray:
+    """ Compute for every motion how well it separates the parties that are close to each other in the ranking.
+
+    For every pair of neighbouring parties in the ranking (of the included parties) a motion separates the pair if
+    both parties existed and voted differently, because then any opinion on the motion changes the score of only one
+    of them. The weight of a pair is higher if the difference between their relative scores is smaller.
+
+    :param masks: The party masks of the motions (see build_party_masks).
+    :param dictionary: The global party dictionary of the masks.
+    :param included_parties: The parties of which the ranking is shown to the user.
+    :param scores: For every party how many times it voted the same as the user.
+    :param totals: For every party on how many motions the user had an opinion while the party existed.
+    :return: The separation of every motion, where a higher value is better.
+    """
+    included_parties = set(included_parties)
+    bits = sorted((i for i, p in enumerate(dictionary) if p in included_parties), key=lambda i: dictionary[i])
+    relative_scores = np.array([scores[dictionary[i]] / totals[dictionary[i]] if totals[dictionary[i]] else 0.0
+                                for i in bits])
+    ranking = np.argsort(-relative_scores, kind="stable")
+
+    # Only the votes of the included parties are extracted from the masks, each as a row per column in PARTY_COLUMNS.
+    party_votes = [get_party_votes(masks, bit) for bit in bits]
+    separations = np.zeros(masks.shape[1], dtype=np.float64)
+    for first, second in zip(ranking[:-1], ranking[1:]):
+        first_votes = party_votes[first]
+        second_votes = party_votes[second]
+        weight = 1.0 / (relative_scores[first] - relative_scores[second] + GAP_SMOOTHING)
+        separations += weight * ((first_votes != second_votes).any(axis=0) & first_votes.any(axis=0) &
+                                 second_votes.any(axis=0))
+    return separations
+
+
+def select_motions(masks: np.ndarray, dictionary: List[str], included_parties: List[str], scores: Counter[str],
+                   totals: Counter[str], available: np.ndarray, count: int, order: Optional[np.ndarray] = None) -> \
+        List[int]:
+    """ Select the motions that best separate the parties that are close to each other in the ranking.
+
+    :param masks: The party masks of the motions (see build_party_masks).
+    :param dictionary: The global party dictionary of the masks.
+    :param included_parties: The parties of which the ranking is shown to the user.
+    :param scores: For every party how many times it voted the same as the user.
+    :param totals: For every party on how many motions the user had an opinion while the party existed.
+    :param available: For every motion whether it can still be selected (it has not been shown yet).
+    :param count: The maximum number of motions that are selected.
+    :param order: If given then only the motions at these positions (rows of the masks) are considered, in this
+        order, and available and the returned positions refer to this order.
+    :return: The positions of the selected motions, where the first one is the best motion. Ties are broken by the
+        position of the motion, so the selection is reproducible if the motions are shuffled with the same seed.
+    """
+    count = min(count, int(available.sum()))
+    if count == 0:
+        return []
+
+    separations = get_separations(masks, dictionary, included_parties, scores, totals)
+    if order is not None:
+        separations = separations[order]
+    separations[~available] = -np.inf
+    best = int(np.argmax(separations))
+    if count == 1:
+        return [best]
+
+    separations[best] = -np.inf
+    others = np.argpartition(-separations, count - 2)[:count - 1]
+    others = others[np.argsort(-separations[others], kind="stable")]
+    return [best] + [int(o) for o in others]
@@ -0,0 +1,362 @@
+""" The MotionStore is responsible for storing and loading the motion (Dutch: motie) metadata in a typed columnar
+(Parquet) format.
+
+The store is partitioned into shards by the year in which the motions were voted on. Every shard consists of immutable
+segments: a single segment with (almost) all motions of the shard and delta segments that are appended when motions are
+upserted. A manifest lists the segments in order of their shard, together with the date range of their motions and the
+rows that are replaced by a later segment. Loading motions for a date range only reads the segments that overlap it.
+Writing the manifest is the only step that changes the stored motions, so an interruption never leaves a partially
+updated store behind. An index maps the Id of every stored motion to its segment and row, such that an upsert only costs
+time proportional to the number of upserted motions. When a shard has too many delta segments or replaced rows, only the
+segments of that shard are compacted into a single new segment. """
+import json
+import os
+import shutil
+import sqlite3
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+from pandas import DataFrame
+import pyarrow.parquet as pq
+
+from MotieWijzer.Business import FILTER_CACHE_DIRECTORY, LEGACY_VOTE_MATRIX_PATH, MOTIONS_DATA_PATH, \
+    MOTIONS_INDEX_PATH, MOTIONS_MANIFEST_PATH, MOTIONS_SEGMENT_DIRECTORY, MOTIONS_STORE_PATH
+
+# The columns that contain a list of parties separated by a comma ','.
+PARTY_COLUMNS = ["Proponents", "Absentees", "Opponents"]
+
+# The types in which the columns of the motions are stored (VoteTime is stored as native datetime).
+MOTION_TYPES = {
+    "Size": "int64",
+    "Accepted": "bool",
+    "NumProponents": "int16",
+    "Proponents": "category",
+    "NumAbsentees": "int16",
+    "Absentees": "category",
+    "NumOpponents": "int16",
+    "Opponents": "category",
+}
+
+LEGACY_SEGMENT = "base"  # The name of the segment of a motion store that was written before segments existed.
+MAX_DELTA_SEGMENTS = 8  # The maximum number of delta segments of a shard before the shard is compacted.
+MAX_REPLACED_FRACTION = 0.25  # The maximum fraction of replaced rows of a shard before the shard is compacted.
+INDEX_BATCH_SIZE = 500  # The maximum number of Ids that are looked up in the index with a single query.
+
+
+def normalize_motions(motions: DataFrame) -> DataFrame:
+    """ Convert the columns of the motions to the types in which they are stored.
+
+    :param motions: The motions that are converted, e.g. freshly parsed rows or rows read from the legacy CSV file.
+    :return: The motions where VoteTime is a (timezone naive) datetime in Dutch time and all other columns have the
+        type given in MOTION_TYPES.
+    """
+    motions = motions.copy()
+    for column in PARTY_COLUMNS:
+        motions[column] = motions[column].mask(motions[column] == "")  # No parties are stored as missing value.
+    if not pd.api.types.is_datetime64_dtype(motions["VoteTime"]):
+        # The vote time is stored as local time in the Netherlands, so the timezone offset is dropped.
+        motions["VoteTime"] = pd.to_datetime(motions["VoteTime"].astype(str).str.slice(0, 19))
+    return motions.astype({c: t for c, t in MOTION_TYPES.items() if c in motions.columns})
+
+
+def get_segment_path(name: str) -> str:
+    """ Get the path of the Parquet file of a segment. """
+    return MOTIONS_STORE_PATH if name == LEGACY_SEGMENT else f"{MOTIONS_SEGMENT_DIRECTORY}/{name}.parquet"
+
+
+def write_parquet(motions: DataFrame, path: str):
+    """ Write the motions into a Parquet file. A temporary file is written first, such that an interruption never
+    leaves a partially written file behind. """
+    temporary_path = f"{path}.tmp"
+    motions.to_parquet(temporary_path, index=False)
+    os.replace(temporary_path, path)
+
+
+def get_shards(motions: DataFrame) -> pd.Series:
+    """ Get the shard of every motion, which is the year in which it was voted on. """
+    return motions["VoteTime"].dt.year.astype(str)
+
+
+def read_segment(segment: Dict[str, Any], columns: Optional[List[str]] = None) -> DataFrame:
+    """ Read the motions of a segment without the replaced rows. """
+    motions = pd.read_parquet(get_segment_path(segment["name"]), columns=columns)
+    return motions.drop(index=segment["replaced"]) if segment["replaced"] else motions
+
+
+def combine_segments(frames: List[DataFrame]) -> DataFrame:
+    """ Combine the motions of multiple segments, keeping their index. """
+    if len(frames) == 1:
+        return frames[0]
+
+    # The categories of the party columns differ per segment, so they are combined into a single categorical again.
+    motions = pd.concat(frames)
+    return motions.astype({c: "category" for c in PARTY_COLUMNS if c in motions.columns})
+
+
+def write_segment(motions: DataFrame, shard: str, manifest: Dict[str, Any]) -> Dict[str, Any]:
+    """ Write the motions of a shard into a new segment, which still has to be added to the manifest.
+
+    :param motions: The normalized motions, which all belong to the shard.
+    :param shard: The shard of the motions (see get_shards).
+    :param manifest: The manifest of the motion store, of which the number of the next segment is increased.
+    :return: The segment as it is listed in the manifest (see load_manifest).
+    """
+    name = str(manifest["next_segment"])
+    manifest["next_segment"] += 1
+    os.makedirs(MOTIONS_SEGMENT_DIRECTORY, exist_ok=True)
+    write_parquet(motions.reset_index(drop=True), get_segment_path(name))
+    start, end = (None, None) if len(motions) == 0 else \
+        (motions["VoteTime"].min().isoformat(), motions["VoteTime"].max().isoformat())
+    return {"name": name, "shard": shard, "start": start, "end": end, "rows": len(motions), "replaced": []}
+
+
+def insert_segment(manifest: Dict[str, Any], segment: Dict[str, Any]):
+    """ Insert a segment into the manifest after the last segment of its shard, such that the segments stay ordered by
+    shard. """
+    position = sum(1 for s in manifest["segments"] if s["shard"] <= segment["shard"])
+    manifest["segments"].insert(position, segment)
+
+
+def group_segments(manifest: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """ Group the segments of the manifest by their shard, in order of the shards. """
+    shards: Dict[str, List[Dict[str, Any]]] = dict()
+    for segment in manifest["segments"]:
+        shards.setdefault(segment["shard"], []).append(segment)
+    return shards
+
+
+def get_shard_signature(segments: List[Dict[str, Any]]) -> List[List[Any]]:
+    """ Get the signature of the segments of a shard, which changes whenever motions of the shard are added or replaced
+    (because segments are never modified), such that data derived from a shard only has to be derived again if its
+    signature changed. """
+    return [[segment["name"], len(segment["replaced"])] for segment in segments]
+
+
+def read_manifest() -> Optional[Dict[str, Any]]:
+    """ Read the manifest of the motion store as it is written, or None if there is no manifest yet. """
+    if not os.path.isfile(MOTIONS_MANIFEST_PATH):
+        return None
+
+    with open(MOTIONS_MANIFEST_PATH, "r") as f:
+        return json.load(f)
+
+
+def load_manifest() -> Dict[str, Any]:
+    """ Load the manifest of the motion store. If only the legacy CSV file exists then it is migrated first, and if the
+    motion store was written before it was partitioned into shards then it is partitioned first.
+
+    :return: A dictionary with the following keys:
+        - version: Changes every time motions are saved or upserted.
+        - next_segment: The number that is used as name of the next segment.
+        - segments: For every segment in order of its shard its name, its shard, the first and last VoteTime of its
+            motions in ISO format (start and end, which are None if it has no motions), its number of rows and the rows
+            that are replaced by a later segment (replaced).
+    """
+    manifest = read_manifest()
+    if manifest is not None:
+        if all("shard" in segment for segment in manifest["segments"]):
+            return manifest
+    elif os.path.isfile(MOTIONS_STORE_PATH):
+        # The motion store was written before segments existed, so it consists of a single segment.
+        rows = pq.ParquetFile(MOTIONS_STORE_PATH).metadata.num_rows
+        manifest = {"segments": [{"name": LEGACY_SEGMENT, "rows": rows, "replaced": []}]}
+    else:
+        migrate_motions()
+        return load_manifest()
+
+    save_motions(combine_segments([read_segment(segment) for segment in manifest["segments"]]))
+    return load_manifest()
+
+
+def save_manifest(manifest: Dict[str, Any]):
+    """ Save the manifest of the motion store (see load_manifest) with a new version. """
+    manifest["version"] = time.time_ns()
+    temporary_path = f"{MOTIONS_MANIFEST_PATH}.tmp"
+    with open(temporary_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(temporary_path, MOTIONS_MANIFEST_PATH)
+
+
+def connect_index(manifest: Dict[str, Any]) -> sqlite3.Connection:
+    """ Connect to the index that maps the Id of every stored motion to its segment and row. If the index does not
+    belong to the version of the manifest (e.g. because an upsert was interrupted) then it is rebuilt first. """
+    connection = sqlite3.connect(MOTIONS_INDEX_PATH)
+    connection.execute("CREATE TABLE IF NOT EXISTS ids (id TEXT PRIMARY KEY, segment TEXT, row INTEGER)")
+    connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+    version = connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+    if version is None or version[0] != manifest["version"]:
+        with connection:
+            connection.execute("DELETE FROM ids")
+            for segment in manifest["segments"]:
+                ids = read_segment(segment, ["Id"])["Id"]
+                connection.executemany("INSERT OR REPLACE INTO ids (id, segment, row) VALUES (?, ?, ?)",
+                                       ((id, segment["name"], int(row)) for row, id in ids.items()))
+            set_index_version(connection, manifest["version"])
+    return connection
+
+
+def set_index_version(connection: sqlite3.Connection, version: int):
+    """ Mark the index as belonging to the given version of the manifest. """
+    connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (version,))
+
+
+def remove_legacy_vote_matrices():
+    """ Remove the vote matrices that older versions stored for the base segment and next to every other segment. The
+    party masks replaced them, so this is a one-off migration cleanup: nothing writes these files anymore. """
+    if os.path.isfile(LEGACY_VOTE_MATRIX_PATH):
+        os.remove(LEGACY_VOTE_MATRIX_PATH)
+    for entry in os.scandir(MOTIONS_SEGMENT_DIRECTORY):
+        if entry.name.endswith(".npz"):
+            os.remove(entry.path)
+
+
+def remove_unused_segments(manifest: Dict[str, Any]):
+    """ Remove the files of all segments (and their party masks) that are not in the manifest anymore. """
+    names = {segment["name"] for segment in manifest["segments"]}
+    if LEGACY_SEGMENT not in names and os.path.isfile(MOTIONS_STORE_PATH):
+        os.remove(MOTIONS_STORE_PATH)
+    for entry in os.scandir(MOTIONS_SEGMENT_DIRECTORY):
+        if entry.name.split(".")[0] not in names:
+            os.remove(entry.path)
+    remove_legacy_vote_matrices()
+
+
+def save_motions(motions: DataFrame):
+    """ Save the motions into the motion store as a single new segment per shard.
+
+    :param motions: The motions that are saved, which replace all previously stored motions.
+    """
+    motions = normalize_motions(motions)
+    old_manifest = read_manifest()
+    manifest = {"next_segment": 1 if old_manifest is None else old_manifest["next_segment"], "segments": []}
+    for shard, shard_motions in motions.groupby(get_shards(motions), sort=True):
+        manifest["segments"].append(write_segment(shard_motions, shard, manifest))
+    if not manifest["segments"]:
+        manifest["segments"].append(write_segment(motions, "", manifest))  # Keeps the columns of an empty store.
+
+    save_manifest(manifest)
+    remove_unused_segments(manifest)
+    shutil.rmtree(FILTER_CACHE_DIRECTORY, ignore_errors=True)  # The cached filter results belong to the old motions.
+    # The index no longer belongs to the manifest, so it is rebuilt at the next upsert.
+
+
+def upsert_motions(motions: DataFrame):
+    """ Upsert motions into the motion store: motions with an Id that is already stored replace the stored motion and
+    all other motions are added. The motions are appended as a delta segment to every shard they belong to, so the cost
+    only depends on the number of upserted motions and not on the number of stored motions.
+
+    :param motions: The motions that are upserted. If an Id occurs multiple times then the last motion is used.
+    """
+    if len(motions) == 0:
+        return
+    if not has_motions():
+        save_motions(motions)
+        return
+
+    motions = normalize_motions(motions).drop_duplicates("Id", keep="last")
+    manifest = load_manifest()
+    new_segments = [(write_segment(shard_motions, shard, manifest), shard_motions["Id"].tolist())
+                    for shard, shard_motions in motions.groupby(get_shards(motions), sort=True)]
+
+    connection = connect_index(manifest)
+    try:
+        segments = {segment["name"]: segment for segment in manifest["segments"]}
+        ids = motions["Id"].tolist()
+        for start in range(0, len(ids), INDEX_BATCH_SIZE):
+            batch = ids[start:start + INDEX_BATCH_SIZE]
+            query = f"SELECT segment, row FROM ids WHERE id IN ({', '.join('?' * len(batch))})"
+            for segment, row in connection.execute(query, batch):
+                segments[segment]["replaced"].append(row)
+
+        for segment, _ in new_segments:
+            insert_segment(manifest, segment)
+        save_manifest(manifest)
+        with connection:
+            for segment, segment_ids in new_segments:
+                connection.executemany("INSERT OR REPLACE INTO ids (id, segment, row) VALUES (?, ?, ?)",
+                                       ((id, segment["name"], row) for row, id in enumerate(segment_ids)))
+            set_index_version(connection, manifest["version"])
+    finally:
+        connection.close()
+    shutil.rmtree(FILTER_CACHE_DIRECTORY, ignore_errors=True)  # The cached filter results belong to the old motions.
+
+
+def compact_motions():
+    """ Compact the segments of every shard that has too many delta segments or too many replaced rows (see
+    MAX_DELTA_SEGMENTS and MAX_REPLACED_FRACTION) into a single new segment. Shards that were not upserted into are
+    never rewritten. """
+    if not has_motions():
+        return
+
+    manifest = load_manifest()
+    compacted = False
+    for shard, segments in group_segments(manifest).items():
+        replaced = sum(len(segment["replaced"]) for segment in segments)
+        rows = sum(segment["rows"] for segment in segments)
+        if len(segments) - 1 > MAX_DELTA_SEGMENTS or replaced > MAX_REPLACED_FRACTION * rows:
+            motions = combine_segments([read_segment(segment) for segment in segments])
+            manifest["segments"] = [segment for segment in manifest["segments"] if segment["shard"] != shard]
+            if len(motions) > 0:
+                insert_segment(manifest, write_segment(motions, shard, manifest))
+            compacted = True
+
+    if compacted:
+        save_manifest(manifest)
+        remove_unused_segments(manifest)
+        shutil.rmtree(FILTER_CACHE_DIRECTORY, ignore_errors=True)  # The cached results belong to the old positions.
+
+
+def migrate_motions():
+    """ Migrate the motions from the legacy pipe-separated CSV file into the motion store. """
+    motions = pd.read_csv(MOTIONS_DATA_PATH, sep="|")
+    save_motions(motions)
+
+
+def has_motions() -> bool:
+    """ Check if any motions are stored, either in the motion store or in the legacy CSV file. """
+    return os.path.isfile(MOTIONS_MANIFEST_PATH) or os.path.isfile(MOTIONS_STORE_PATH) or \
+        os.path.isfile(MOTIONS_DATA_PATH)
+
+
+def get_version() -> int:
+    """ Get the version of the motion store, which changes every time the motions are saved or upserted. """
+    return load_manifest()["version"]
+
+
+def overlaps(segment: Dict[str, Any], start_date: Optional[date], end_date: Optional[date]) -> bool:
+    """ Check if any motion of a segment can have been voted on between the start date and the end date (inclusive),
+    where a date that is None is unbounded. """
+    if start_date is None and end_date is None:
+        return True
+    if segment["start"] is None:
+        return False
+    if start_date is not None and pd.Timestamp(segment["end"]) < pd.Timestamp(start_date):
+        return False
+    return end_date is None or pd.Timestamp(segment["start"]) < pd.Timestamp(end_date) + timedelta(days=1)
+
+
+def load_motions(columns: Optional[List[str]] = None, start_date: Optional[date] = None,
+                 end_date: Optional[date] = None) -> DataFrame:
+    """ Load the motions from the motion store. If only the legacy CSV file exists then it is migrated first.
+
+    :param columns: The columns that are loaded or None if all columns are loaded.
+    :param start_date: If given then only the segments with motions on or after this date are read.
+    :param end_date: If given then only the segments with motions on or before this date are read.
+    :return: The stored motions of all (read) segments in order, without the replaced rows. The index of every motion
+        is its position among all stored motions, also if only some segments are read, so it can be used to look up
+        the motions in the party masks. The read segments can contain motions outside of the dates, which still have
+        to be filtered out (see filter_motions).
+    """
+    segments = load_manifest()["segments"]
+    frames = []
+    offset = 0
+    for segment in segments:
+        if overlaps(segment, start_date, end_date):
+            frame = read_segment(segment, columns)
+            frames.append(frame.set_axis(pd.RangeIndex(offset, offset + len(frame))))
+        offset += segment["rows"] - len(segment["replaced"])
+    if not frames:
+        return read_segment(segments[0], columns).iloc[:0]
+    return combine_segments(frames)
@@ -0,0 +1,137 @@
+""" The ODataFixtures record the OData responses of the Tweede Kamer API while downloading and replay them with a local
+stand-in HTTP server, such that the downloader can be run (and benchmarked) offline and reproducibly. The stand-in
+server can inject latency and errors to simulate a slow or unreliable API. """
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+lock = threading.Lock()  # Makes sure that fixtures are not written by multiple threads at the same time.
+
+
+def get_fixture_key(relative_url: str) -> str:
+    """ Get the key of the fixture of a request, which does not depend on the order of the query parameters.
+
+    :param relative_url: The requested url relative to the API root, including the query string.
+    """
+    path, _, query = relative_url.partition("?")
+    query = urllib.parse.urlencode(sorted(urllib.parse.parse_qsl(query, keep_blank_values=True)))
+    return hashlib.sha1(f"{urllib.parse.unquote(path)}?{query}".encode()).hexdigest()
+
+
+def record_fixture(directory: str, api_root: str, url: str, status: int, body: bytes):
+    """ Record the response of a request as a fixture.
+
+    :param directory: The directory in which the fixture is stored.
+    :param api_root: The API root to which the request was sent.
+    :param url: The full requested url, including the query string.
+    :param status: The HTTP status code of the response.
+    :param body: The body of the response.
+    """
+    relative_url = url[len(api_root):]
+    fixture = {"api_root": api_root, "url": relative_url, "status": status, "body": body.decode()}
+    with lock:
+        os.makedirs(directory, exist_ok=True)
+        temporary_path = f"{directory}/{get_fixture_key(relative_url)}.json.tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(fixture, f)
+        os.replace(temporary_path, temporary_path[:-4])
+
+
+class FixtureServer(ThreadingHTTPServer):
+    """ A local stand-in for the OData API, which replays the recorded fixtures. Links in the responses that point to
+    the recorded API root (e.g. the links to the next page) are rewritten to point to this server. """
+    daemon_threads = True
+
+    def __init__(self, directory: str, host: str, port: int, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 503, seed: int = 0):
+        """ Create the fixture server.
+
+        :param directory: The directory with the recorded fixtures.
+        :param host: The address on which the server listens.
+        :param port: The port on which the server listens or 0 for any free port.
+        :param latency: The minimum number of seconds before every response is sent.
+        :param jitter: The maximum number of seconds that is randomly added to the latency of every response.
+        :param error_rate: The fraction of the requests that is answered with error_status instead of the fixture.
+        :param error_status: The HTTP status code of the injected errors, e.g. 503 or 429.
+        :param seed: The seed of the random generator that decides the jitter and which requests fail.
+        """
+        super().__init__((host, port), FixtureRequestHandler)
+        self.directory = directory
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.requests = 0
+
+    @property
+    def api_root(self) -> str:
+        """ The API root under which this server replays the fixtures. """
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def load_fixture(self, relative_url: str) -> Optional[Dict[str, Any]]:
+        """ Load the fixture of a request or return None if it was not recorded. """
+        path = f"{self.directory}/{get_fixture_key(relative_url)}.json"
+        if not os.path.isfile(path):
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def draw(self) -> Tuple[float, bool]:
+        """ Draw the delay in seconds of the next response and whether it is an injected error. """
+        with self.random_lock:
+            self.requests += 1
+            return self.latency + self.random.uniform(0.0, self.jitter), self.random.random() < self.error_rate
+
+
+class FixtureRequestHandler(BaseHTTPRequestHandler):
+    """ Answers a request to the fixture server with the recorded fixture. """
+    server: FixtureServer
+
+    def do_GET(self):
+        """ Answer a GET request. """
+        delay, error = self.server.draw()
+        time.sleep(delay)
+        if error:
+            self.send_json(self.server.error_status, json.dumps({"error": {"message": "Geïnjecteerde fout."}}))
+            return
+
+        fixture = self.server.load_fixture(self.path.lstrip("/"))
+        if fixture is None:
+            print(f"Geen fixture opgenomen voor: {urllib.parse.unquote(self.path)}", file=sys.stderr)
+            self.send_json(404, json.dumps({"error": {"message": "Geen fixture opgenomen."}}))
+            return
+        self.send_json(fixture["status"], fixture["body"].replace(fixture["api_root"], self.server.api_root))
+
+    def send_json(self, status: int, body: str):
+        """ Send a JSON response. """
+        body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any):
+        """ Do not log every request, because the downloader sends many of them. """
+
+
+def run_fixture_server(directory: str, host: str, port: int, latency: float, jitter: float, error_rate: float,
+                       error_status: int, seed: int):
+    """ Run the fixture server until it is interrupted (see FixtureServer for the parameters). """
+    with FixtureServer(directory, host, port, latency, jitter, error_rate, error_status, seed) as server:
+        print(f"De fixture server draait op {server.api_root}, gebruik 'python MotieWijzer download --api "
+              f"{server.api_root}' om de opgenomen antwoorden te downloaden.")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
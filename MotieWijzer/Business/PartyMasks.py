@@ -0,0 +1,209 @@
+""" The PartyMasks store for every motion (Dutch: motie) the sets of parties that voted in favor, did not vote and voted
+against as fixed-width bitmasks over a global party dictionary. Bit i of a mask is set if the i-th party of the
+dictionary is in the set, so checking which parties existed, taking unions and counting missing parties are bitwise
+operations on integer vectors instead of operations on (split) party strings. A mask uses a single 64 bit word per
+motion for up to 64 parties, which is much smaller than a dense matrix of votes or the party strings. Where scores are
+computed with matrix products, only the masks of the involved motions are unpacked.
+
+The dictionary only grows: a new party gets the next free bit, so the masks of all segments of the motion store use the
+same bits for the same parties and can be combined without remapping. """
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from pandas import DataFrame
+import pandas as pd
+
+from MotieWijzer.Business import MOTIONS_SEGMENT_DIRECTORY, PARTY_DICTIONARY_PATH
+from MotieWijzer.Business.MotionStore import PARTY_COLUMNS, get_segment_path, load_manifest
+
+WORD_SIZE = 64  # The number of parties that fit in a single word of a mask.
+COUNT_CHUNK_SIZE = 65536  # The number of masks of which the bits are counted at the same time.
+
+
+def load_party_dictionary() -> List[str]:
+    """ Load the global party dictionary, where the position of a party is the bit of that party in the masks. """
+    if not os.path.isfile(PARTY_DICTIONARY_PATH):
+        return []
+
+    with open(PARTY_DICTIONARY_PATH, "r") as f:
+        return json.load(f)
+
+
+def extend_party_dictionary(parties: List[str]) -> List[str]:
+    """ Add the parties that are not in the global party dictionary yet to the end of it.
+
+    :return: The extended party dictionary.
+    """
+    dictionary = load_party_dictionary()
+    known = set(dictionary)
+    new_parties = sorted({p for p in parties if p not in known})
+    if new_parties:
+        dictionary += new_parties
+        temporary_path = f"{PARTY_DICTIONARY_PATH}.tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(dictionary, f)
+        os.replace(temporary_path, PARTY_DICTIONARY_PATH)
+    return dictionary
+
+
+def get_word_count(party_count: int) -> int:
+    """ Get the number of 64 bit words of a mask over the given number of parties. """
+    return max((party_count + WORD_SIZE - 1) // WORD_SIZE, 1)
+
+
+def encode_parties(parties: List[str], party_index: Dict[str, int], words: int) -> np.ndarray:
+    """ Encode a set of parties into a mask with the given number of words. """
+    mask = np.zeros(words, dtype=np.uint64)
+    for party in parties:
+        bit = party_index[party]
+        mask[bit // WORD_SIZE] |= np.uint64(1) << np.uint64(bit % WORD_SIZE)
+    return mask
+
+
+def build_party_masks(motions: DataFrame) -> np.ndarray:
+    """ Build the party masks for the given motions. Parties that are not in the global party dictionary yet are added.
+
+    :param motions: The motions (with categorical party columns) for which the masks are built.
+    :return: A uint64 array with for every column in PARTY_COLUMNS (in that order) a row for every motion, where every
+        row is the mask of the parties in that column (see get_word_count for the number of words).
+    """
+    parties = {p for column in PARTY_COLUMNS for ps in motions[column].cat.categories for p in ps.split(",")}
+    dictionary = extend_party_dictionary(list(parties))
+    party_index = {p: i for i, p in enumerate(dictionary)}
+    words = get_word_count(len(dictionary))
+
+    masks = np.zeros((len(PARTY_COLUMNS), len(motions), words), dtype=np.uint64)
+    for column_index, column in enumerate(PARTY_COLUMNS):
+        # Only the distinct party lists are encoded, the motions are mapped onto them through the category codes. The
+        # extra last row belongs to the code -1, which is used for missing values.
+        categories = motions[column].cat.categories
+        category_masks = np.zeros((len(categories) + 1, words), dtype=np.uint64)
+        for category_index, ps in enumerate(categories):
+            category_masks[category_index] = encode_parties(ps.split(","), party_index, words)
+        masks[column_index] = category_masks[motions[column].cat.codes.to_numpy()]
+    return masks
+
+
+def get_party_masks_path(name: str) -> str:
+    """ Get the path of the party masks of a segment of the motion store. """
+    return f"{MOTIONS_SEGMENT_DIRECTORY}/{name}.masks.npy"
+
+
+def load_segment_party_masks(name: str) -> np.ndarray:
+    """ Load the party masks of all motions in a segment (including the replaced ones). If they do not exist yet or if
+    they are older than the segment then they are built first.
+
+    :return: The party masks as returned by build_party_masks, which can have fewer words than the dictionary if
+        parties were added to the dictionary afterwards.
+    """
+    path = get_party_masks_path(name)
+    if not os.path.isfile(path) or os.path.getmtime(path) < os.path.getmtime(get_segment_path(name)):
+        masks = build_party_masks(pd.read_parquet(get_segment_path(name), columns=PARTY_COLUMNS))
+        os.makedirs(MOTIONS_SEGMENT_DIRECTORY, exist_ok=True)
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "wb") as f:
+            np.save(f, masks)
+        os.replace(temporary_path, path)
+    return np.load(path)
+
+
+def load_party_masks(segments: Optional[List[Dict[str, Any]]] = None) -> Tuple[np.ndarray, List[str]]:
+    """ Load the party masks of all stored motions, which combines the masks of all segments of the motion store
+    without the replaced rows. Only the masks of new segments are built.
+
+    :param segments: The segments (from the manifest) of which the masks are loaded or None for all segments.
+    :return: The party masks (see build_party_masks) and the global party dictionary.
+    """
+    if segments is None:
+        segments = load_manifest()["segments"]
+    if not os.path.isfile(PARTY_DICTIONARY_PATH) and os.path.isdir(MOTIONS_SEGMENT_DIRECTORY):
+        # The bits of existing masks are unknown without the dictionary, so the masks of all segments are removed and
+        # built again when they are loaded, also of the segments that are not loaded now.
+        for entry in os.scandir(MOTIONS_SEGMENT_DIRECTORY):
+            if entry.name.endswith(".masks.npy"):
+                os.remove(entry.path)
+    segment_masks = [load_segment_party_masks(segment["name"]) for segment in segments]
+    dictionary = load_party_dictionary()
+    words = get_word_count(len(dictionary))
+    if len(segments) == 1 and not segments[0]["replaced"] and segment_masks[0].shape[2] == words:
+        return segment_masks[0], dictionary
+
+    rows = sum(segment["rows"] - len(segment["replaced"]) for segment in segments)
+    masks = np.zeros((len(PARTY_COLUMNS), rows, words), dtype=np.uint64)
+    start = 0
+    for segment, segment_mask in zip(segments, segment_masks):
+        segment_mask = np.delete(segment_mask, segment["replaced"], axis=1)
+        masks[:, start:start + segment_mask.shape[1], :segment_mask.shape[2]] = segment_mask
+        start += segment_mask.shape[1]
+    return masks, dictionary
+
+
+def get_party_masks(motions: DataFrame) -> Tuple[np.ndarray, List[str]]:
+    """ Get the party masks for the given motions. Only the masks of the segments that contain any of the motions are
+    loaded (or built), like load_motions only reads the segments that overlap with the requested dates.
+
+    :param motions: Motions loaded from the motion store (possibly filtered or shuffled), which still have the index
+        under which they were loaded.
+    :return: The party masks with a row for every given motion (in the same order) and the global party dictionary.
+    """
+    segments = load_manifest()["segments"]
+    # The global position of the first motion of every segment, which is the index that load_motions gives it.
+    offsets = np.cumsum([0] + [segment["rows"] - len(segment["replaced"]) for segment in segments])
+    positions = motions.index.to_numpy()
+    segment_indices = np.searchsorted(offsets, positions, side="right") - 1
+    used = np.unique(segment_indices)
+    masks, dictionary = load_party_masks([segments[i] for i in used])
+
+    # The position of every motion in the combined masks of only the used segments.
+    used_offsets = np.cumsum([0] + [offsets[i + 1] - offsets[i] for i in used])[:-1]
+    local_positions = positions - offsets[segment_indices] + used_offsets[np.searchsorted(used, segment_indices)]
+    return masks[:, local_positions], dictionary
+
+
+def get_existing_masks(masks: np.ndarray) -> np.ndarray:
+    """ Get for every motion the mask of the parties that existed during the vote, which is the union of the parties
+    that voted in favor, did not vote and voted against. """
+    return np.bitwise_or.reduce(masks, axis=0)
+
+
+def get_party_names(mask: np.ndarray, dictionary: List[str]) -> List[str]:
+    """ Get the sorted names of the parties in a single mask. """
+    bits = np.unpackbits(mask.astype("<u8").view(np.uint8), bitorder="little")[:len(dictionary)]
+    return sorted(dictionary[i] for i in np.flatnonzero(bits))
+
+
+def count_party_members(masks: np.ndarray, party_count: int) -> np.ndarray:
+    """ Count for every party in how many of the masks it is set.
+
+    :param masks: The masks of which the bits are counted, with a row for every motion.
+    :param party_count: The number of parties in the dictionary.
+    :return: The count of every party, in the order of the dictionary.
+    """
+    counts = np.zeros(masks.shape[1] * WORD_SIZE, dtype=np.int64)
+    for start in range(0, len(masks), COUNT_CHUNK_SIZE):
+        chunk = masks[start:start + COUNT_CHUNK_SIZE].astype("<u8").view(np.uint8)
+        counts += np.unpackbits(chunk, axis=1, bitorder="little").sum(axis=0, dtype=np.int64)
+    return counts[:party_count]
+
+
+def unpack_party_masks(masks: np.ndarray, party_count: int) -> np.ndarray:
+    """ Unpack masks into a boolean for every party, e.g. to compute scores with matrix products.
+
+    :param masks: The masks that are unpacked, with the words in the last dimension.
+    :param party_count: The number of parties in the dictionary.
+    :return: The masks with the words replaced by whether every party of the dictionary is in the mask.
+    """
+    bits = np.unpackbits(masks.astype("<u8").view(np.uint8), axis=-1, bitorder="little")
+    return bits[..., :party_count].astype(bool)
+
+
+def get_party_votes(masks: np.ndarray, bit: int) -> np.ndarray:
+    """ Get for every motion in which of the PARTY_COLUMNS a single party is.
+
+    :param masks: The party masks of the motions (see build_party_masks).
+    :param bit: The position of the party in the dictionary.
+    :return: A boolean array with a row for every column in PARTY_COLUMNS and a column for every motion.
+    """
+    return (masks[:, :, bit // WORD_SIZE] >> np.uint64(bit % WORD_SIZE)) & np.uint64(1) == np.uint64(1)
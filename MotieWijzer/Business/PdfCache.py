@@ -0,0 +1,135 @@
+""" The PdfCache stores downloaded motion (Dutch: motie) PDF files on disk, keyed by the document Id, such that a PDF
+is only downloaded once. If the cache exceeds its size budget then the least recently used PDF files are removed. """
+import json
+import os
+import threading
+from typing import Any, Dict, List, Tuple
+
+from MotieWijzer.Business import PDF_CACHE_DIRECTORY
+from MotieWijzer.Business.HttpClient import client
+
+PDF_CACHE_SETTINGS_PATH = f"{PDF_CACHE_DIRECTORY}/cache.json"  # The path of the file with the settings of the cache.
+DEFAULT_BUDGET = 500 * 1024 * 1024  # The default size budget of the cache in bytes.
+
+lock = threading.Lock()  # Makes sure that evicting and adding files is not done by multiple threads at the same time.
+
+
+def init_cache_directory():
+    """ Create the cache directory if it does not exist yet. """
+    os.makedirs(PDF_CACHE_DIRECTORY, exist_ok=True)
+
+
+def get_budget() -> int:
+    """ Get the size budget of the cache in bytes. """
+    if not os.path.isfile(PDF_CACHE_SETTINGS_PATH):
+        return DEFAULT_BUDGET
+
+    with open(PDF_CACHE_SETTINGS_PATH, "r") as f:
+        return json.load(f)["budget"]
+
+
+def set_budget(budget: int):
+    """ Set the size budget of the cache in bytes. """
+    init_cache_directory()
+    with open(PDF_CACHE_SETTINGS_PATH, "w") as f:
+        json.dump({"budget": budget}, f)
+
+
+def get_pdf_path(id: str) -> str:
+    """ Get the path in which the PDF file of a document is cached. """
+    return f"{PDF_CACHE_DIRECTORY}/{id}.pdf"
+
+
+def is_cached(id: str, size: int = -1) -> bool:
+    """ Check if the PDF file of a document is in the cache.
+
+    :param id: The Id of the document.
+    :param size: The expected size of the PDF file in bytes or -1 if the size is unknown.
+    :return: True if the PDF file is cached (with the expected size), otherwise False.
+    """
+    path = get_pdf_path(id)
+    return os.path.isfile(path) and (size < 0 or os.path.getsize(path) == size)
+
+
+def get_cached_files() -> List[Tuple[str, int, float]]:
+    """ Get all cached PDF files.
+
+    :return: For every cached PDF file the path, the size in bytes and the last time it was used, ordered from least
+        recently used to most recently used.
+    """
+    if not os.path.isdir(PDF_CACHE_DIRECTORY):
+        return []
+
+    files = []
+    for entry in os.scandir(PDF_CACHE_DIRECTORY):
+        if entry.name.endswith(".pdf"):
+            stat = entry.stat()
+            files.append((entry.path, stat.st_size, stat.st_mtime))
+    return sorted(files, key=lambda f: f[2])
+
+
+def evict(budget: int, reserved: int = 0) -> int:
+    """ Remove the least recently used PDF files until the cache fits within the budget.
+
+    :param budget: The size budget of the cache in bytes.
+    :param reserved: The number of bytes that should be left free for a file which is going to be added.
+    :return: The number of removed files.
+    """
+    files = get_cached_files()
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for path, size, _ in files:
+        if total + reserved <= budget:
+            break
+        os.remove(path)
+        total -= size
+        removed += 1
+    return removed
+
+
+def download_pdf(url: str) -> bytes:
+    """ Download the PDF file of a motion with the shared HttpClient, which retries failed downloads.
+
+    :param url: The url from which the PDF file is downloaded.
+    :return: The content of the PDF file.
+    :raises requests.RequestException: If the PDF file could not be downloaded, such that it is never cached.
+    """
+    response = client.get(url, timeout=60)
+    response.raise_for_status()
+    return response.content
+
+
+def fetch_pdf(id: str, url: str, size: int = -1) -> str:
+    """ Get the PDF file of a document from the cache or download it into the cache if it is not cached yet.
+
+    :param id: The Id of the document.
+    :param url: The url from which the PDF file is downloaded if it is not cached.
+    :param size: The size of the PDF file in bytes (the Size column of the motions) which is used to make room in the
+        cache before it is downloaded, or -1 if the size is unknown.
+    :return: The path of the cached PDF file.
+    """
+    path = get_pdf_path(id)
+    if is_cached(id, size):
+        os.utime(path)  # Mark the file as most recently used.
+        return path
+
+    init_cache_directory()
+    with lock:
+        evict(get_budget(), max(size, 0))
+    content = download_pdf(url)
+    with lock:
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "wb") as f:
+            f.write(content)
+        os.replace(temporary_path, path)
+    return path
+
+
+def get_cache_statistics() -> Dict[str, Any]:
+    """ Get statistics about the cache.
+
+    :return: A dictionary with the number of cached files (files), the total size of these files in bytes (size) and
+        the size budget of the cache in bytes (budget).
+    """
+    files = get_cached_files()
+    return {"files": len(files), "size": sum(size for _, size, _ in files), "budget": get_budget()}
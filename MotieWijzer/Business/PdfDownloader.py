@@ -0,0 +1,77 @@
+""" The PdfDownloader downloads the PDF files of many motions (Dutch: moties) into the PDF cache at once, such that
+sessions can be run without network access. """
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from progress.bar import Bar
+from pandas import DataFrame
+import requests
+
+from MotieWijzer.Business.HttpClient import client
+from MotieWijzer.Business.PdfCache import fetch_pdf, is_cached
+
+
+class RateLimiter:
+    """ Limits how many requests are started per second, shared by multiple threads. """
+
+    def __init__(self, rate: float):
+        """ Create the rate limiter.
+
+        :param rate: The maximum number of requests per second or 0 if the number of requests is not limited.
+        """
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """ Wait until the next request is allowed to start. """
+        with self.lock:
+            now = time.monotonic()
+            start_time = max(now, self.next_time)
+            self.next_time = start_time + self.interval
+        time.sleep(max(start_time - now, 0.0))
+
+
+def download_pdf_if_missing(id: str, url: str, size: int, rate_limiter: RateLimiter) -> bool:
+    """ Download the PDF file of a motion into the cache if it is not cached yet with the right size.
+
+    :return: True if the PDF file is downloaded, False if it was already cached.
+    """
+    if is_cached(id, size):
+        return False
+
+    rate_limiter.wait()
+    fetch_pdf(id, url, size)
+    return True
+
+
+def run_pdf_downloader(motions: DataFrame, workers: int, rate: float):
+    """ Run the PDF downloader. PDF files that are already cached are skipped, so an interrupted run can be resumed by
+    running it again. A PDF file that still fails after all retries (see HttpClient) is skipped as well.
+
+    :param motions: The motions of which the PDF files are downloaded.
+    :param workers: The maximum number of PDF files that are downloaded at the same time.
+    :param rate: The maximum number of PDF files of which the download is started per second or 0 for no limit.
+    """
+    rate_limiter = RateLimiter(rate)
+    client.reset_statistics()
+    downloaded = 0
+    failed = 0
+    progress_bar = Bar("PDF's gedownload: ", max=len(motions))
+    progress_bar.start()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(download_pdf_if_missing, id, url, size, rate_limiter)
+                   for id, url, size in zip(motions["Id"], motions["Url"], motions["Size"])]
+        for future in as_completed(futures):
+            try:
+                downloaded += future.result()
+            except requests.RequestException:
+                failed += 1
+            progress_bar.next()
+    progress_bar.finish()
+    if failed > 0:
+        print(f"Het downloaden van {failed} PDF's is mislukt, start het commando later opnieuw om ze alsnog te "
+              f"downloaden.")
+    print(f"Het downloaden van de PDF's is klaar. Aantal nieuw gedownloade PDF's: {downloaded}")
+    print(client.get_summary())
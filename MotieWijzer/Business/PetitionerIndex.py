@@ -0,0 +1,95 @@
+""" The PetitionerIndex is an inverted index from every petitioner (Dutch: indiener) of a motion (Dutch: motie), in the
+form 'naam (fractie)', to the Ids of the motions that the petitioner submitted, stored in SQLite. The Petitioners column
+is only split when a shard of the motion store changed, such that the agreement with every petitioner can be looked up
+from the index instead of parsing the column again every time the results are shown.
+
+A user agrees with a petitioner on a motion if the user is in favor of it, because a petitioner is assumed to be in
+favor of its own motion. """
+import json
+import re
+import sqlite3
+from collections import Counter as counter
+from contextlib import closing
+from typing import Counter, Dict, List, Tuple
+
+from MotieWijzer.Business import PETITIONER_INDEX_PATH
+from MotieWijzer.Business.MotionStore import INDEX_BATCH_SIZE, combine_segments, get_shard_signature, group_segments, \
+    load_manifest, read_segment
+
+
+def split_petitioners(petitioners: str) -> List[str]:
+    """ Split the Petitioners column of a motion into the separate petitioners. Only a comma directly after the closing
+    parenthesis of a fraction separates two petitioners, so commas in names are kept. """
+    if not isinstance(petitioners, str) or petitioners == "":
+        return []
+    return re.split(r"(?<=\)),", petitioners)
+
+
+def connect() -> sqlite3.Connection:
+    """ Connect to the petitioner index and index the shards of the motion store that changed since they were indexed
+    (see get_shard_signature). """
+    connection = sqlite3.connect(PETITIONER_INDEX_PATH)
+    connection.execute("CREATE TABLE IF NOT EXISTS petitions (petitioner TEXT, id TEXT, shard TEXT, "
+                       "PRIMARY KEY (petitioner, id)) WITHOUT ROWID")
+    connection.execute("CREATE INDEX IF NOT EXISTS petitions_id ON petitions (id)")
+    connection.execute("CREATE INDEX IF NOT EXISTS petitions_shard ON petitions (shard)")
+    connection.execute("CREATE TABLE IF NOT EXISTS shards (shard TEXT PRIMARY KEY, signature TEXT)")
+
+    shards = group_segments(load_manifest())
+    signatures = {shard: json.dumps(get_shard_signature(segments)) for shard, segments in shards.items()}
+    indexed = dict(connection.execute("SELECT shard, signature FROM shards"))
+    changed = [shard for shard, signature in signatures.items() if indexed.get(shard) != signature]
+    removed = [shard for shard in indexed if shard not in shards]
+    if not changed and not removed:
+        return connection
+
+    with connection:
+        # All changed shards are removed before any is indexed again, because a motion can move to another shard.
+        for shard in changed + removed:
+            connection.execute("DELETE FROM petitions WHERE shard = ?", (shard,))
+            connection.execute("DELETE FROM shards WHERE shard = ?", (shard,))
+        for shard in changed:
+            motions = combine_segments([read_segment(segment, ["Id", "Petitioners"]) for segment in shards[shard]])
+            petitions = ((petitioner, id, shard) for id, petitioners in zip(motions["Id"], motions["Petitioners"])
+                         for petitioner in split_petitioners(petitioners))
+            connection.executemany("INSERT OR IGNORE INTO petitions (petitioner, id, shard) VALUES (?, ?, ?)",
+                                   petitions)
+            connection.execute("INSERT INTO shards (shard, signature) VALUES (?, ?)", (shard, signatures[shard]))
+    return connection
+
+
+def update_petitioner_index():
+    """ Index the shards of the motion store that changed since they were indexed. """
+    connect().close()
+
+
+def get_petitioners(ids: List[str]) -> Dict[str, List[str]]:
+    """ Get the petitioners of the given motions.
+
+    :return: For every given motion that has any petitioners the sorted petitioners.
+    """
+    petitioners: Dict[str, List[str]] = dict()
+    with closing(connect()) as connection:
+        for start in range(0, len(ids), INDEX_BATCH_SIZE):
+            batch = ids[start:start + INDEX_BATCH_SIZE]
+            query = f"SELECT id, petitioner FROM petitions WHERE id IN ({', '.join('?' * len(batch))}) " \
+                    f"ORDER BY petitioner"
+            for id, petitioner in connection.execute(query, batch):
+                petitioners.setdefault(id, []).append(petitioner)
+    return petitioners
+
+
+def score_petitioners(answers: Dict[str, str]) -> Tuple[Counter[str], Counter[str]]:
+    """ Compute the agreement with every petitioner of the motions on which the user had an opinion.
+
+    :param answers: Maps the Ids of motions to '+' (in favor) or '-' (against), other answers are ignored.
+    :return: For every petitioner of any of the answered motions on how many of its motions the user was in favor
+        (scores) and on how many of its motions the user had an opinion (totals).
+    """
+    answers = {id: answer for id, answer in answers.items() if answer in ("+", "-")}
+    scores, totals = counter(), counter()
+    for id, petitioners in get_petitioners(list(answers)).items():
+        totals.update(petitioners)
+        if answers[id] == "+":
+            scores.update(petitioners)
+    return scores, totals
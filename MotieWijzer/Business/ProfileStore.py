@@ -0,0 +1,142 @@
+""" The ProfileStore stores the saved profiles (the results so far of a user) in a single SQLite database, indexed by
+the name of the profile. Every profile is written in a single transaction, so an interrupted save never leaves a
+truncated profile behind. Profiles that were saved as separate JSON files by older versions are imported when the store
+is created.
+"""
+import json
+import os
+import sqlite3
+from collections import Counter as counter
+from contextlib import closing
+from datetime import date, datetime
+from typing import Any, Counter, Dict, List, Optional
+
+from MotieWijzer.Business import DATA_DIRECTORY, PROFILE_STORE_PATH
+
+IMPORTED_SUFFIX = ".imported"  # Is appended to the file name of a legacy JSON profile once it is imported.
+# The keys that every legacy JSON profile has, which distinguish it from the other JSON files in the data directory.
+LEGACY_PROFILE_KEYS = {"start_date", "scores", "totals", "index"}
+
+
+def connect() -> sqlite3.Connection:
+    """ Connect to the profile store. If it does not exist yet then it is created and the legacy JSON profiles are
+    imported into it. """
+    os.makedirs(DATA_DIRECTORY, exist_ok=True)
+    created = not os.path.isfile(PROFILE_STORE_PATH)
+    connection = sqlite3.connect(PROFILE_STORE_PATH, timeout=30)
+    connection.execute("PRAGMA journal_mode = WAL")  # Readers are not blocked while a profile is written.
+    connection.execute("CREATE TABLE IF NOT EXISTS profiles (name TEXT PRIMARY KEY, profile TEXT NOT NULL, "
+                       "updated TEXT NOT NULL)")
+    if created:
+        import_json_profiles(connection)
+    return connection
+
+
+def import_json_profiles(connection: sqlite3.Connection):
+    """ Import the profiles that were saved as separate JSON files in the data directory. Only the JSON files with all
+    LEGACY_PROFILE_KEYS are profiles, the other JSON files (like the manifest of the motion store) are left alone. A
+    profile that already exists in the store is not overwritten. Every imported file is renamed (by appending
+    IMPORTED_SUFFIX), so it can still be restored by hand. """
+    paths = [entry.path for entry in os.scandir(DATA_DIRECTORY) if entry.name.endswith(".json") and entry.is_file()]
+
+    imported = []
+    with connection:
+        for path in paths:
+            try:
+                with open(path, "r") as f:
+                    profile = json.load(f)
+            except (OSError, ValueError):
+                continue  # A truncated profile can not be imported, so it is left alone.
+            if not isinstance(profile, dict) or not LEGACY_PROFILE_KEYS <= profile.keys():
+                continue
+            name = os.path.basename(path)[:-5]
+            updated = datetime.fromtimestamp(os.path.getmtime(path)).isoformat(timespec="seconds")
+            connection.execute("INSERT OR IGNORE INTO profiles (name, profile, updated) VALUES (?, ?, ?)",
+                               (name, json.dumps(profile), updated))
+            imported.append(path)
+
+    for path in imported:
+        os.replace(path, path + IMPORTED_SUFFIX)
+
+
+def write_profile(name: str, start_date: date, end_date: date, regex: str, query: str, included_parties: List[str],
+                  seed: int, scores: Counter[str], totals: Counter[str], index: int, adaptive: bool, shown: List[str],
+                  answers: Dict[str, str]):
+    """ Write the results so far into a profile, which replaces the profile with the same name if it exists.
+
+    :param answers: Maps the Ids of the motions on which the user had an opinion to '+' (in favor) or '-' (against).
+    """
+    profile = json.dumps({
+        "start_date": start_date.strftime("%Y-%m-%d"),
+        "end_date": end_date.strftime("%Y-%m-%d"),
+        "regex": regex,
+        "query": query,
+        "included_parties": included_parties,
+        "seed": seed,
+        "scores": scores,
+        "totals": totals,
+        "index": index,
+        "adaptive": adaptive,
+        "shown": shown,
+        "answers": answers
+    })
+    with closing(connect()) as connection, connection:
+        connection.execute("INSERT INTO profiles (name, profile, updated) VALUES (?, ?, ?) "
+                           "ON CONFLICT (name) DO UPDATE SET profile = excluded.profile, updated = excluded.updated",
+                           (name, profile, datetime.now().isoformat(timespec="seconds")))
+
+
+def read_profile(name: str) -> Optional[Dict[str, Any]]:
+    """ Read a profile.
+
+    :return: A dictionary with the same keys as written by write_profile, where the dates are parsed into datetimes
+        and the scores and totals into counters, or None if the profile does not exist.
+    """
+    with closing(connect()) as connection:
+        row = connection.execute("SELECT profile FROM profiles WHERE name = ?", (name,)).fetchone()
+    if row is None:
+        return None
+
+    profile = json.loads(row[0])
+    return {
+        "start_date": datetime.strptime(profile["start_date"], "%Y-%m-%d"),
+        "end_date": datetime.strptime(profile["end_date"], "%Y-%m-%d"),
+        "regex": profile["regex"],
+        "query": profile.get("query", ""),  # Profiles saved before the search index existed have no query.
+        "included_parties": profile["included_parties"],
+        "seed": profile["seed"],
+        "scores": counter(profile["scores"]),
+        "totals": counter(profile["totals"]),
+        "index": profile["index"],
+        "adaptive": profile.get("adaptive", False),  # Profiles saved before adaptive ordering are random.
+        "shown": profile.get("shown", []),
+        "answers": profile.get("answers", dict())  # Profiles saved before the petitioner index have no answers.
+    }
+
+
+def has_profile(name: str) -> bool:
+    """ Check if a profile with the given name exists. """
+    with closing(connect()) as connection:
+        return connection.execute("SELECT 1 FROM profiles WHERE name = ?", (name,)).fetchone() is not None
+
+
+def get_profile_names(prefix: str = "", limit: int = -1) -> List[str]:
+    """ Get the names of the saved profiles in alphabetical order.
+
+    :param prefix: If given then only the names that start with this prefix are returned.
+    :param limit: The maximum number of names that are returned or -1 for all names.
+    """
+    with closing(connect()) as connection:
+        # The range condition (instead of LIKE) makes sure that the index of the primary key is used.
+        if prefix:
+            rows = connection.execute("SELECT name FROM profiles WHERE name >= ? AND name < ? ORDER BY name LIMIT ?",
+                                      (prefix, prefix + "\U0010ffff", limit))
+        else:
+            rows = connection.execute("SELECT name FROM profiles ORDER BY name LIMIT ?", (limit,))
+        return [name for name, in rows]
+
+
+def count_profiles() -> int:
+    """ Get the number of saved profiles. """
+    with closing(connect()) as connection:
+        return connection.execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
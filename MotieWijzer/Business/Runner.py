@@ -1,42 +1,95 @@
 """ Randomly selects a motion (Dutch: motie) in the new way. """
-import json
 import os
-import re
 import subprocess
 import sys
 from collections import Counter as counter
-from datetime import date, datetime
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date
 from sys import platform
-from typing import Counter, List, Tuple
+from typing import Counter, Dict, List, Optional, Tuple
 
 from colorama import Back, Style, Fore
+import numpy as np
 from pandas import DataFrame
 import pandas as pd
 import requests
 
-from MotieWijzer.Business import DATA_DIRECTORY, MOTIONS_DATA_PATH
-from MotieWijzer.Business.InfoRetriever import filter_motions
-
-PDF_OUTPUT_FILE_PATH = f"{DATA_DIRECTORY}/output.pdf"  # The path in which the motion PDF is stored.
+from MotieWijzer.Business import PREFETCH_SIZE
+from MotieWijzer.Business.InfoRetriever import load_filtered_motions
+from MotieWijzer.Business.MotionSelector import select_motions
+from MotieWijzer.Business.PartyMasks import get_party_masks, get_party_names
+from MotieWijzer.Business.PdfCache import fetch_pdf
+from MotieWijzer.Business.PetitionerIndex import score_petitioners
+from MotieWijzer.Business.ProfileStore import read_profile, write_profile
+
+# The columns of the motions that are used by the runner. The parties are read from the party masks, so the party
+# columns are not loaded.
+RUNNER_COLUMNS = ["Id", "Subject", "VoteTime", "Url", "Size", "Accepted", "NumProponents", "NumAbsentees",
+                  "NumOpponents", "Petitioners"]
+
+
+class PdfPrefetcher:
+    """ Downloads the PDF files of the upcoming motions into the PDF cache in the background while the user reads the
+    current motion. At most the PDFs of the next `size` motions are downloaded ahead. """
+
+    def __init__(self, size: int):
+        """ Create the prefetcher.
+
+        :param size: The number of upcoming motion PDFs that are downloaded in the background.
+        """
+        self.size = size
+        self.executor = ThreadPoolExecutor(max_workers=max(size, 1))
+        self.futures: Dict[str, Future] = dict()
+
+    def get(self, motion: pd.Series, upcoming: DataFrame) -> str:
+        """ Get the PDF file of a motion and start downloading the PDFs of the upcoming motions.
+
+        :param motion: The motion of which the PDF file is returned.
+        :param upcoming: The motions that are (most likely) shown next, of which the first `size` are downloaded.
+        :return: The path of the cached PDF file, which is waited for if it has not been downloaded yet.
+        """
+        documents = [(motion["Id"], motion["Url"], motion["Size"])]
+        upcoming = upcoming[:self.size]
+        documents += list(zip(upcoming["Id"], upcoming["Url"], upcoming["Size"]))
+
+        ids = {id for id, _, _ in documents}
+        for old_id in [id for id in self.futures if id not in ids]:
+            self.futures.pop(old_id).cancel()
+
+        for document in documents:
+            if document[0] not in self.futures:
+                self.futures[document[0]] = self.executor.submit(fetch_pdf, *document)
+        return self.futures[motion["Id"]].result()
+
+    def close(self):
+        """ Cancel all downloads that have not started yet. """
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.futures.clear()
+
+
+def open_pdf(path: str):
+    """ Open a PDF file with the default PDF viewer. """
+    if platform == "linux" or platform == "linux2":
+        subprocess.Popen([f"xdg-open {path}"], shell=True)
+    else:
+        os.startfile(f"{sys.path[0]}/{path}")
 
 
 def show_motion(motion: pd.Series):
-    """ Download and show the PDF file of the motion.
+    """ Download (if it is not cached yet) and show the PDF file of the motion.
 
     :param motion: The motion row data of which the PDF is downloaded and shown.
     """
-    response = requests.get(url=motion["Url"], timeout=60)
-    with open(PDF_OUTPUT_FILE_PATH, "wb") as f:
-        f.write(response.content)
+    open_pdf(fetch_pdf(motion["Id"], motion["Url"], motion["Size"]))
 
-    if platform == "linux" or platform == "linux2":
-        subprocess.Popen([f"xdg-open {PDF_OUTPUT_FILE_PATH}"], shell=True)
-    else:
-        os.startfile(f"{sys.path[0]}/{PDF_OUTPUT_FILE_PATH}")
 
+def show_additional_motion_info(motion: pd.Series, masks: np.ndarray, dictionary: List[str]):
+    """ Show additional motion info.
 
-def show_additional_motion_info(motion: pd.Series):
-    """ Show additional motion info. """
+    :param masks: The party masks of the motion (a mask for every column in PARTY_COLUMNS), from which the parties per
+        vote are shown.
+    :param dictionary: The global party dictionary of the masks.
+    """
     subject = motion["Subject"]
     vote_time = motion["VoteTime"].date()
     url = motion["Url"]
@@ -44,9 +97,7 @@ def show_additional_motion_info(motion: pd.Series):
     num_proponents = motion["NumProponents"]
     num_opponents = motion["NumOpponents"]
     num_absentees = motion["NumAbsentees"]
-    proponents = str(motion["Proponents"]).replace(",", ", ")
-    opponents = str(motion["Opponents"]).replace(",", ", ")
-    absentees = str(motion["Absentees"]).replace("nan", "").replace(",", ", ")
+    proponents, absentees, opponents = (", ".join(get_party_names(mask, dictionary)) for mask in masks)
     petitioners = motion["Petitioners"].replace(",", ", ")
 
     print(Back.GREEN + f"Motie titel: {subject}" + Style.RESET_ALL)
@@ -63,63 +114,77 @@ def show_additional_motion_info(motion: pd.Series):
     print()
 
 
-def show_result(scores: Counter[str], totals: Counter[str], included_parties: List[str]):
-    """ Show the resemblance with the different parties. """
+def get_ranking(scores: Counter[str], totals: Counter[str], included_parties: Optional[List[str]] = None) -> \
+    List[Tuple[str, int, int, float]]:
+    """ Get the resemblance with the different parties.
+
+    :param included_parties: The parties that are included in the ranking or None if all parties are included.
+    :return: For every party the party name, the score, the total and the percentage of agreement, ordered from the
+        highest to the lowest percentage.
+    """
     relative_scores = counter({p: round(scores[p] / t, 3) * 100 for p, t in totals.items()})
-    for p, rs in relative_scores.most_common():
-        if p in included_parties:
-            print("{}: {}/{} = {:.1f}%".format(p, scores[p], totals[p], rs))
+    return [(p, scores[p], totals[p], rs) for p, rs in relative_scores.most_common()
+            if included_parties is None or p in included_parties]
+
+
+def show_result(scores: Counter[str], totals: Counter[str], included_parties: List[str], answers: Dict[str, str]):
+    """ Show the resemblance with the different parties and with the petitioners of the answered motions.
+
+    :param answers: Maps the Ids of the motions on which the user had an opinion to '+' (in favor) or '-' (against).
+    """
+    for p, score, total, rs in get_ranking(scores, totals, included_parties):
+        print("{}: {}/{} = {:.1f}%".format(p, score, total, rs))
     print()
 
+    petitioner_scores, petitioner_totals = score_petitioners(answers)
+    if petitioner_totals:
+        print("Overeenkomst met de indieners van de moties:")
+        for p, score, total, rs in get_ranking(petitioner_scores, petitioner_totals):
+            print("{}: {}/{} = {:.1f}%".format(p, score, total, rs))
+        print()
 
-def update_scores(motion: pd.Series, accepted: bool, scores: Counter[str], totals: Counter[str]) -> \
-    Tuple[Counter[str], Counter[str]]:
-    """ Update scores based on whether the user accepts/rejects the motion. """
-    proponents = [] if not isinstance(motion["Proponents"], str) else motion["Proponents"].split(",")
-    absentees = [] if not isinstance(motion["Absentees"], str) else motion["Absentees"].split(",")
-    opponents = [] if not isinstance(motion["Opponents"], str) else motion["Opponents"].split(",")
-    existing_parties = proponents + absentees + opponents
 
-    totals.update(existing_parties)
-    if accepted:
-        scores.update(proponents)
-    else:
-        scores.update(opponents)
+def update_scores(masks: np.ndarray, dictionary: List[str], accepted: bool, scores: Counter[str],
+                  totals: Counter[str]) -> Tuple[Counter[str], Counter[str]]:
+    """ Update scores based on whether the user accepts/rejects the motion.
 
+    :param masks: The party masks of the motion (a mask for every column in PARTY_COLUMNS). A party that is in multiple
+        columns (a split vote) is counted for every column, so a party that voted both in favor and against gets two
+        to its total and one to its score. Within a column a party is counted once (see parse_vote_info).
+    :param dictionary: The global party dictionary of the masks.
+    """
+    proponents, absentees, opponents = (get_party_names(mask, dictionary) for mask in masks)
+    totals.update(proponents + absentees + opponents)
+    scores.update(proponents if accepted else opponents)
     return scores, totals
 
 
-def save(start_date: date, end_date: date, regex: str, included_parties: List[str], seed: int, scores: Counter[str],
-         totals: Counter[str], index: int):
-    """ Save the results so far into a file. """
+def save(start_date: date, end_date: date, regex: str, query: str, included_parties: List[str], seed: int,
+         scores: Counter[str], totals: Counter[str], index: int, adaptive: bool, shown: List[str],
+         answers: Dict[str, str]):
+    """ Save the results so far into a profile. """
     while True:
         user_input = input("Profiel naam: ")
         print()
 
-        file_name = f"{DATA_DIRECTORY}/{user_input}.json"
+        if user_input.strip() == "":
+            print(Fore.WHITE + Back.RED + "De profiel naam mag niet leeg zijn." + Style.RESET_ALL)
+            print()
+            continue
         try:
-            json_object = json.dumps({
-                "start_date": start_date.strftime("%Y-%m-%d"),
-                "end_date": end_date.strftime("%Y-%m-%d"),
-                "regex": regex,
-                "included_parties": included_parties,
-                "seed": seed,
-                "scores": scores,
-                "totals": totals,
-                "index": index
-            })
-            with open(file_name, "w") as f:
-                f.write(json_object)
-
+            write_profile(user_input, start_date, end_date, regex, query, included_parties, seed, scores, totals,
+                          index, adaptive, shown, answers)
             return
         except:
-            print(Fore.WHITE + Back.RED + f"Kon {file_name} niet opslaan." + Style.RESET_ALL)
+            print(Fore.WHITE + Back.RED + f"Kon profiel '{user_input}' niet opslaan." + Style.RESET_ALL)
             print()
 
 
-def ask_user_input_motion(motion: pd.Series, scores: Counter[str], totals: Counter[str], included_parties: List[str],
-                          start_date: date, end_date: date, regex: str, seed: int, index: int) -> Tuple[Counter[str], Counter[str]]:
-    """ Ask the user what to do with the motion. """
+def ask_user_input_motion(motion: pd.Series, masks: np.ndarray, dictionary: List[str], scores: Counter[str],
+                          totals: Counter[str], included_parties: List[str], start_date: date, end_date: date,
+                          regex: str, query: str, seed: int, index: int, adaptive: bool, shown: List[str],
+                          answers: Dict[str, str]) -> Tuple[Counter[str], Counter[str]]:
+    """ Ask the user what to do with the motion. The opinion of the user on the motion is added to the answers. """
     while True:
         print("Kies het volgende: ")
         print("'i': Om extra informatie over de motie te laten zien.")
@@ -132,23 +197,27 @@ def ask_user_input_motion(motion: pd.Series, scores: Counter[str], totals: Count
         user_input = input()
         print()
         if user_input == "i":
-            show_additional_motion_info(motion)
+            show_additional_motion_info(motion, masks, dictionary)
         elif user_input == "o":
             show_motion(motion)
         elif user_input == "r":
-            show_result(scores, totals, included_parties)
+            show_result(scores, totals, included_parties, answers)
         elif user_input == "s":
-            save(start_date, end_date, regex, included_parties, seed, scores, totals, index)
+            save(start_date, end_date, regex, query, included_parties, seed, scores, totals, index, adaptive, shown,
+                 answers)
         elif user_input == "+":
-            return update_scores(motion, True, scores, totals)
+            answers[motion["Id"]] = user_input
+            return update_scores(masks, dictionary, True, scores, totals)
         elif user_input == "0":
             return scores, totals
         elif user_input == "-":
-            return update_scores(motion, False, scores, totals)
+            answers[motion["Id"]] = user_input
+            return update_scores(masks, dictionary, False, scores, totals)
 
 
 def ask_user_input_no_motion(scores: Counter[str], totals: Counter[str], included_parties: List[str], start_date: date,
-                             end_date: date, regex: str, seed: int, index: int) -> Tuple[Counter[str], Counter[str]]:
+                             end_date: date, regex: str, query: str, seed: int, index: int, adaptive: bool,
+                             shown: List[str], answers: Dict[str, str]) -> Tuple[Counter[str], Counter[str]]:
     """ Ask the user what to do after all motions are displayed. """
     while True:
         print("Kies het volgende: ")
@@ -157,52 +226,78 @@ def ask_user_input_no_motion(scores: Counter[str], totals: Counter[str], include
         user_input = input()
         print()
         if user_input == "r":
-            show_result(scores, totals, included_parties)
+            show_result(scores, totals, included_parties, answers)
         elif user_input == "s":
-            save(start_date, end_date, regex, included_parties, seed, scores, totals, index)
-
-
-def run(motions: DataFrame, start_date: date, end_date: date, regex: str, included_parties: List[str], seed: int,
-        scores: Counter[str], totals: Counter[str], index: int):
-    """ Run the random motion selecter. """
+            save(start_date, end_date, regex, query, included_parties, seed, scores, totals, index, adaptive, shown,
+                 answers)
+
+
+def run(motions: DataFrame, start_date: date, end_date: date, regex: str, query: str, included_parties: List[str],
+        seed: int, scores: Counter[str], totals: Counter[str], index: int, prefetch: int = PREFETCH_SIZE,
+        adaptive: bool = False, shown: Optional[List[str]] = None,
+        answers: Optional[Dict[str, str]] = None):
+    """ Run the random motion selecter.
+
+    :param prefetch: The number of upcoming motion PDFs that are downloaded in the background.
+    :param adaptive: If true then the next motion is the one that best separates the parties that are currently the
+        closest to each other in the ranking (see MotionSelector), otherwise the motions are shown in random order.
+    :param shown: The Ids of the motions on which the user already gave an opinion, or None if there are none yet.
+    :param answers: Maps the Ids of the motions on which the user had an opinion to '+' (in favor) or '-' (against),
+        or None if there are none yet. The helpers of the runner always get the (new) list and dictionary.
+    """
+    shown = [] if shown is None else shown
+    answers = dict() if answers is None else answers
     motions = motions.sample(frac=1.0, random_state=seed)  # Shuffle the motions in a random order.
-    motions = motions[index:]
+    if adaptive:
+        available = ~motions["Id"].isin(shown).to_numpy()
+    else:
+        motions = motions[index:]
+        available = np.ones(len(motions), dtype=bool)
+    masks, dictionary = get_party_masks(motions)
+    prefetcher = PdfPrefetcher(prefetch)
     print()
-    for _, motion in motions.iterrows():
-        subject = motion["Subject"]
-        print(Back.GREEN + f"Motie titel: {subject}" + Style.RESET_ALL)
-        show_motion(motion)
-        scores, totals = ask_user_input_motion(motion, scores, totals, included_parties, start_date, end_date, regex,
-                                               seed, index)
-        index += 1
+    try:
+        while available.any():
+            if adaptive:
+                positions = select_motions(masks, dictionary, included_parties, scores, totals, available,
+                                           prefetch + 1)
+            else:
+                first = int(np.argmax(available))
+                positions = list(range(first, min(first + prefetch + 1, len(motions))))
+            position = positions[0]
+            available[position] = False
+
+            motion = motions.iloc[position]
+            subject = motion["Subject"]
+            print(Back.GREEN + f"Motie titel: {subject}" + Style.RESET_ALL)
+            try:
+                open_pdf(prefetcher.get(motion, motions.iloc[positions[1:]]))
+            except requests.RequestException:
+                print(Fore.WHITE + Back.RED + f"De PDF van deze motie kon niet gedownload worden, open hem zelf via: "
+                                              f"{motion['Url']}" + Style.RESET_ALL)
+            scores, totals = ask_user_input_motion(motion, masks[:, position], dictionary, scores, totals,
+                                                   included_parties, start_date, end_date, regex, query, seed, index,
+                                                   adaptive, shown, answers)
+            shown.append(motion["Id"])
+            index += 1
+    finally:
+        prefetcher.close()
 
     print(Back.YELLOW + f"Er zijn geen nieuwe moties meer." + Style.RESET_ALL)
-    ask_user_input_no_motion(scores, totals, included_parties, start_date, end_date, regex, seed, index)
-
+    ask_user_input_no_motion(scores, totals, included_parties, start_date, end_date, regex, query, seed, index,
+                             adaptive, shown, answers)
 
-def load(file_name: str):
-    """ Load a profile and continue from there. """
-    with open(file_name, "r") as f:
-        json_objects = json.load(f)
 
-    start_date = json_objects["start_date"]
-    start_date = re.fullmatch(r"(\d{4})-(\d{2})-(\d{2})", start_date)
-    start_date = start_date.groups()
-    start_date = datetime(year=int(start_date[0]), month=int(start_date[1]), day=int(start_date[2]))
+def load(name: str, prefetch: int = PREFETCH_SIZE):
+    """ Load a profile and continue from there.
 
-    end_date = json_objects["end_date"]
-    end_date = re.fullmatch(r"(\d{4})-(\d{2})-(\d{2})", end_date)
-    end_date = end_date.groups()
-    end_date = datetime(year=int(end_date[0]), month=int(end_date[1]), day=int(end_date[2]))
-
-    regex = json_objects["regex"]
-    included_parties = json_objects["included_parties"]
-    seed = json_objects["seed"]
-    scores = counter(json_objects["scores"])
-    totals = counter(json_objects["totals"])
-    index = json_objects["index"]
-
-    motions = pd.read_csv(MOTIONS_DATA_PATH, sep="|")
-    motions = filter_motions(motions, start_date, end_date, regex)
+    :param name: The name of the profile, which must exist.
+    :param prefetch: The number of upcoming motion PDFs that are downloaded in the background.
+    """
+    profile = read_profile(name)
+    motions = load_filtered_motions(profile["start_date"], profile["end_date"], profile["regex"], profile["query"],
+                                    RUNNER_COLUMNS)
 
-    return run(motions, start_date, end_date, regex, included_parties, seed, scores, totals, index)
\ No newline at end of file
+    return run(motions, profile["start_date"], profile["end_date"], profile["regex"], profile["query"],
+               profile["included_parties"], profile["seed"], profile["scores"], profile["totals"], profile["index"],
+               prefetch, profile["adaptive"], profile["shown"], profile["answers"])
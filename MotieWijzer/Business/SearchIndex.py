@@ -0,0 +1,69 @@
+""" The SearchIndex extracts the text of the downloaded motion (Dutch: motie) PDF files and stores it in a full-text
+(SQLite FTS5) index, such that motions can be searched on their content instead of only on their subject. """
+import os
+import sqlite3
+from contextlib import closing
+from typing import List, Set
+
+from progress.bar import Bar
+from pypdf import PdfReader
+
+from MotieWijzer.Business import SEARCH_INDEX_PATH
+from MotieWijzer.Business.PdfCache import get_pdf_path, is_cached
+
+
+def connect() -> sqlite3.Connection:
+    """ Connect to the search index and create it if it does not exist yet. """
+    connection = sqlite3.connect(SEARCH_INDEX_PATH)
+    connection.execute("CREATE VIRTUAL TABLE IF NOT EXISTS motions USING fts5(id UNINDEXED, text, "
+                       "tokenize = 'unicode61 remove_diacritics 2')")
+    return connection
+
+
+def extract_text(path: str) -> str:
+    """ Extract the text of a PDF file. """
+    reader = PdfReader(path)
+    return "\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+def index_pdfs(ids: List[str]):
+    """ Add the text of the cached PDF files of the given documents to the search index. Documents that are already
+    indexed or of which the PDF file is not cached are skipped.
+
+    :param ids: The Ids of the documents that are indexed.
+    """
+    with closing(connect()) as connection, connection:
+        indexed = {id for id, in connection.execute("SELECT id FROM motions")}
+        ids = [id for id in ids if id not in indexed and is_cached(id)]
+        if not ids:
+            return
+
+        progress_bar = Bar("PDF's geïndexeerd: ", max=len(ids))
+        progress_bar.start()
+        for id in ids:
+            try:
+                text = extract_text(get_pdf_path(id))
+            except Exception:
+                text = ""  # The PDF file can not be read, so it is stored as empty to not retry it every time.
+            connection.execute("INSERT INTO motions (id, text) VALUES (?, ?)", (id, text))
+            progress_bar.next()
+        progress_bar.finish()
+
+
+def search(query: str) -> Set[str]:
+    """ Search the motions of which the text matches the query.
+
+    :param query: The query in FTS5 syntax, e.g. 'trein' for a keyword, '"gratis openbaar vervoer"' for a phrase or
+        'trein OR bus' for either keyword.
+    :return: The Ids of the documents that match the query.
+    :raises sqlite3.OperationalError: If the query does not have the right syntax, also if there is no search index yet.
+    """
+    if not os.path.isfile(SEARCH_INDEX_PATH):
+        # The syntax is checked on an empty in-memory index, so a wrong query is also rejected before PDFs are indexed.
+        with closing(sqlite3.connect(":memory:")) as connection:
+            connection.execute("CREATE VIRTUAL TABLE motions USING fts5(text)")
+            connection.execute("SELECT 1 FROM motions WHERE motions MATCH ?", (query,)).fetchall()
+        return set()
+
+    with closing(connect()) as connection:
+        return {id for id, in connection.execute("SELECT id FROM motions WHERE motions MATCH ?", (query,))}
@@ -0,0 +1,430 @@
+""" The Server serves the MotieWijzer over a local HTTP API, where the motion (Dutch: motie) data is loaded once and
+shared by all sessions. All requests and responses are JSON. The API has the following endpoints:
+    - POST /sessies: Start a new session. The body can contain start, eind, regex, zoek, inclusief, seed and adaptief,
+        which have the same meaning as the parameters of the start command.
+    - POST /sessies/laden: Continue a saved profile in a new session. The body contains the name of the profile.
+    - GET /sessies/{sessie}/motie: Get the current motion of the session or null if there are no motions left.
+    - POST /sessies/{sessie}/stem: Give an opinion on the current motion. The body contains the antwoord, which is '+',
+        '0' or '-'.
+    - GET /sessies/{sessie}/resultaten: Get the resemblance with the different parties and with the petitioners of the
+        answered motions so far.
+    - POST /sessies/{sessie}/opslaan: Save the session into a profile. The body contains the name of the profile.
+    - DELETE /sessies/{sessie}: End the session.
+    - POST /overeenkomst: Get how often every pair of parties voted the same (see AgreementMatrix). The body can contain
+        start, eind, regex and zoek, which have the same meaning as the parameters of the overeenkomst command.
+"""
+import asyncio
+import json
+import random
+import re
+import sqlite3
+import uuid
+from collections import Counter as counter, OrderedDict as ordered_dict
+from datetime import date, datetime
+from typing import Any, Callable, Counter, Dict, List, Optional, OrderedDict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from MotieWijzer.Business.AgreementMatrix import compute_agreement, get_percentages
+from MotieWijzer.Business.InfoRetriever import filter_motions
+from MotieWijzer.Business.MotionSelector import select_motions
+from MotieWijzer.Business.MotionStore import load_motions
+from MotieWijzer.Business.PartyMasks import get_existing_masks, get_party_names, load_party_masks
+from MotieWijzer.Business.PetitionerIndex import score_petitioners
+from MotieWijzer.Business.ProfileStore import read_profile, write_profile
+from MotieWijzer.Business.Runner import get_ranking, update_scores
+from MotieWijzer.Business.SearchIndex import search
+
+# The columns of the motions that are kept in memory, which are the columns of a motion in a response and the columns
+# that are needed to filter motions. The parties are read from the party masks, so the party columns are not loaded.
+SERVER_COLUMNS = ["Id", "Subject", "VoteTime", "Url", "Accepted", "NumProponents", "NumAbsentees", "NumOpponents",
+                  "Petitioners"]
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+# The number of filters of which the positions and the agreement matrix are kept in memory, the least recently used
+# filters are removed first.
+FILTER_CACHE_SIZE = 64
+# The names of the JSON types of the fields of a request body, which are shown in the error message of a wrong field.
+TYPE_NAMES = {str: "string", int: "geheel getal", bool: "boolean"}
+
+
+class RequestError(Exception):
+    """ An error in a request, which is returned to the client with the given status. """
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class Session:
+    """ The state of a single user of the server, which contains the same information as a profile. The motions are
+    stored as positions in the shared motions, so sessions do not copy the motion data. """
+
+    def __init__(self, order: np.ndarray, start_date: date, end_date: date, regex: str, query: str,
+                 included_parties: List[str], seed: int, scores: Counter[str], totals: Counter[str], index: int,
+                 adaptive: bool, shown: List[str], answers: Dict[str, str], ids: np.ndarray):
+        """ Create the session.
+
+        :param order: The positions of the filtered motions in the shared motions, shuffled with the seed.
+        :param answers: Maps the Ids of the motions on which the user had an opinion to '+' or '-'.
+        :param ids: The Ids of the shared motions, which are used to determine which motions are already shown.
+        """
+        self.order = order
+        self.start_date = start_date
+        self.end_date = end_date
+        self.regex = regex
+        self.query = query
+        self.included_parties = included_parties
+        self.seed = seed
+        self.scores = scores
+        self.totals = totals
+        self.index = index
+        self.adaptive = adaptive
+        self.shown = shown
+        self.answers = answers
+        if adaptive:
+            self.available = ~np.isin(ids[order], shown)
+        else:
+            self.available = np.arange(len(order)) >= index
+        self.current: Optional[int] = None
+
+
+class MotionServer:
+    """ Handles the requests of all sessions on the shared motion data. Filtering motions and computing agreement
+    matrices run in worker threads, so a heavy request does not block the requests of other sessions. The state of the
+    server (sessions and caches) is only changed on the thread of the event loop. """
+
+    def __init__(self):
+        """ Load the motion data and the party masks. """
+        self.motions = load_motions(SERVER_COLUMNS)
+        self.ids = self.motions["Id"].to_numpy()
+        self.masks, self.dictionary = load_party_masks()
+        self.sessions: Dict[str, Session] = dict()
+        self.filters: OrderedDict[Tuple[date, date, str, str], np.ndarray] = ordered_dict()
+        self.agreements: OrderedDict[Tuple[date, date, str, str], Dict[str, Any]] = ordered_dict()
+
+    async def get_positions(self, start_date: date, end_date: date, regex: str, query: str) -> np.ndarray:
+        """ Get the positions of the motions that match the filter, which are cached per filter. """
+        key = (start_date, end_date, regex, query)
+        return await get_cached(self.filters, key,
+                                lambda: filter_motions(self.motions, *key).index.to_numpy())
+
+    async def create_session(self, start_date: date, end_date: date, regex: str, query: str,
+                             included_parties: List[str], seed: int, scores: Counter[str], totals: Counter[str],
+                             index: int, adaptive: bool, shown: List[str], answers: Dict[str, str]) -> str:
+        """ Create a new session, where the motions are shuffled in the same way as in the runner.
+
+        :return: The id of the session.
+        """
+        positions = await self.get_positions(start_date, end_date, regex, query)
+        order = pd.Series(positions).sample(frac=1.0, random_state=seed).to_numpy()
+        session_id = uuid.uuid4().hex
+        self.sessions[session_id] = Session(order, start_date, end_date, regex, query, included_parties, seed, scores,
+                                            totals, index, adaptive, shown, answers, self.ids)
+        return session_id
+
+    def get_current_motion(self, session: Session) -> Optional[int]:
+        """ Get the position (in the order of the session) of the motion that is currently shown in the session, or
+        None if there are no motions left. """
+        if session.current is None and session.available.any():
+            if session.adaptive:
+                session.current = select_motions(self.masks, self.dictionary, session.included_parties,
+                                                 session.scores, session.totals, session.available, 1,
+                                                 session.order)[0]
+            else:
+                session.current = int(np.argmax(session.available))
+        return session.current
+
+    def get_session(self, session_id: str) -> Session:
+        """ Get a session or raise a RequestError if it does not exist. """
+        if session_id not in self.sessions:
+            raise RequestError(404, f"De sessie '{session_id}' bestaat niet.")
+        return self.sessions[session_id]
+
+    async def start(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """ Handle the request to start a new session. """
+        start_date, end_date, regex, query = parse_filter(body)
+
+        positions = await self.get_positions(start_date, end_date, regex, query)
+        if len(positions) == 0:
+            raise RequestError(400, "Er zijn geen moties die aan het filter voldoen.")
+        existing = np.bitwise_or.reduce(get_existing_masks(self.masks[:, positions]), axis=0)
+        all_parties = get_party_names(existing, self.dictionary)
+        inclusief = get_field(body, "inclusief", "")
+        included_parties = all_parties if inclusief == "" else inclusief.split(",")
+        missing_parties = [p for p in included_parties if p not in all_parties]
+        if missing_parties:
+            raise RequestError(400, f"De volgende partijen in de inclusief parameter bestaan niet: "
+                                    f"{', '.join(missing_parties)}")
+
+        seed = get_field(body, "seed", -1, int)
+        if seed < 0:
+            seed = random.randint(0, 2 ** 31)
+
+        session_id = await self.create_session(start_date, end_date, regex, query, included_parties, seed, counter(),
+                                               counter(), 0, get_field(body, "adaptief", False, bool), [], dict())
+        return {"sessie": session_id, "seed": seed, "partijen": included_parties}
+
+    async def load(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """ Handle the request to continue a saved profile in a new session. """
+        name = get_profile_name(body)
+        profile = read_profile(name)
+        if profile is None:
+            raise RequestError(404, f"Het profiel '{name}' bestaat niet.")
+        session_id = await self.create_session(profile["start_date"], profile["end_date"], profile["regex"],
+                                               profile["query"], profile["included_parties"], profile["seed"],
+                                               profile["scores"], profile["totals"], profile["index"],
+                                               profile["adaptive"], profile["shown"], profile["answers"])
+        return {"sessie": session_id}
+
+    def motion(self, session: Session) -> Dict[str, Any]:
+        """ Handle the request to get the current motion of a session. """
+        current = self.get_current_motion(session)
+        if current is None:
+            return {"motie": None}
+        position = session.order[current]
+        return {"motie": motion_to_json(self.motions.iloc[position], self.masks[:, position], self.dictionary)}
+
+    def vote(self, session: Session, body: Dict[str, Any]) -> Dict[str, Any]:
+        """ Handle the request to give an opinion on the current motion of a session. """
+        answer = body.get("antwoord")
+        if answer not in ("+", "0", "-"):
+            raise RequestError(400, "Het antwoord moet '+', '0' of '-' zijn.")
+        current = self.get_current_motion(session)
+        if current is None:
+            raise RequestError(400, "Er zijn geen nieuwe moties meer.")
+
+        position = session.order[current]
+        if answer != "0":
+            session.answers[self.ids[position]] = answer
+            update_scores(self.masks[:, position], self.dictionary, answer == "+", session.scores, session.totals)
+        session.available[current] = False
+        session.shown.append(self.ids[position])
+        session.index += 1
+        session.current = None
+        return self.results(session)
+
+    def results(self, session: Session) -> Dict[str, Any]:
+        """ Handle the request to get the resemblance with the different parties and with the petitioners of the
+        answered motions of a session. """
+        ranking = get_ranking(session.scores, session.totals, session.included_parties)
+        petitioner_ranking = get_ranking(*score_petitioners(session.answers))
+        return {"resultaten": [{"partij": p, "score": s, "totaal": t, "percentage": round(rs, 1)}
+                               for p, s, t, rs in ranking],
+                "indieners": [{"indiener": p, "score": s, "totaal": t, "percentage": round(rs, 1)}
+                              for p, s, t, rs in petitioner_ranking]}
+
+    def save(self, session: Session, body: Dict[str, Any]) -> Dict[str, Any]:
+        """ Handle the request to save a session into a profile. """
+        name = get_profile_name(body)
+        write_profile(name, session.start_date, session.end_date, session.regex, session.query,
+                      session.included_parties, session.seed, session.scores, session.totals, session.index,
+                      session.adaptive, session.shown, session.answers)
+        return {"profiel": name}
+
+    async def agreement(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """ Handle the request to get the agreement matrix of the filtered motions, which is cached per filter. """
+        start_date, end_date, regex, query = parse_filter(body)
+
+        positions = await self.get_positions(start_date, end_date, regex, query)
+        if len(positions) == 0:
+            raise RequestError(400, "Er zijn geen moties die aan het filter voldoen.")
+
+        def compute() -> Dict[str, Any]:
+            agreement = compute_agreement(self.masks[:, positions], self.dictionary)
+            return {**agreement, "percentages": get_percentages(agreement)}
+
+        return await get_cached(self.agreements, (start_date, end_date, regex, query), compute)
+
+    async def handle_request(self, method: str, path: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        """ Route a request to its handler.
+
+        :return: The JSON response.
+        :raises RequestError: If the request is not valid.
+        """
+        if path == "/sessies":
+            check_method(method, "POST")
+            return await self.start(body)
+        if path == "/sessies/laden":
+            check_method(method, "POST")
+            return await self.load(body)
+        if path == "/overeenkomst":
+            check_method(method, "POST")
+            return await self.agreement(body)
+
+        match = re.fullmatch(r"/sessies/([0-9a-f]+)(/[a-z]+)?", path)
+        if match is None:
+            raise RequestError(404, f"Het pad '{path}' bestaat niet.")
+        session_id, action = match.groups()
+        session = self.get_session(session_id)
+        if action is None:
+            check_method(method, "DELETE")
+            del self.sessions[session_id]
+            return {"sessie": session_id}
+        if action == "/motie":
+            check_method(method, "GET")
+            return self.motion(session)
+        if action == "/stem":
+            check_method(method, "POST")
+            return self.vote(session, body)
+        if action == "/resultaten":
+            check_method(method, "GET")
+            return self.results(session)
+        if action == "/opslaan":
+            check_method(method, "POST")
+            return self.save(session, body)
+        raise RequestError(404, f"Het pad '{path}' bestaat niet.")
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """ Handle all requests on a (keep-alive) connection. """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = dict()
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                try:
+                    body = json.loads(body) if body else dict()
+                    if not isinstance(body, dict):
+                        raise RequestError(400, "De body moet een JSON object zijn.")
+                    status, response = 200, await self.handle_request(method, path, body)
+                except RequestError as e:
+                    status, response = e.status, {"fout": str(e)}
+                except (ValueError, KeyError, OSError, sqlite3.Error) as e:
+                    status, response = 400, {"fout": str(e)}
+                except Exception as e:  # A bug must not close the connection without a response.
+                    status, response = 500, {"fout": f"Er is een interne fout opgetreden: {e!r}"}
+
+                payload = json.dumps(response).encode()
+                writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass  # The client closed the connection or sent an invalid request line.
+        finally:
+            writer.close()
+
+
+def check_method(method: str, expected: str):
+    """ Check if a request uses the expected method or raise a RequestError otherwise. """
+    if method != expected:
+        raise RequestError(405, f"Gebruik {expected} voor dit pad.")
+
+
+async def get_cached(cache: OrderedDict, key: Any, compute: Callable[[], Any]) -> Any:
+    """ Get a value from a least recently used cache of at most FILTER_CACHE_SIZE values, where the value is computed
+    in a worker thread and added if it is not in the cache yet. The compute function must only read the shared data. """
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+    value = await asyncio.get_running_loop().run_in_executor(None, compute)
+    cache[key] = value  # Another request can have added the same key while the value was computed.
+    cache.move_to_end(key)
+    if len(cache) > FILTER_CACHE_SIZE:
+        cache.popitem(last=False)
+    return value
+
+
+def get_field(body: Dict[str, Any], name: str, default: Any, field_type: type = str) -> Any:
+    """ Get a field from the body of a request or raise a RequestError if it does not have the expected type.
+
+    :param default: The value if the body does not contain the field.
+    :param field_type: The expected type of the field, one of the keys of TYPE_NAMES.
+    """
+    value = body.get(name, default)
+    # A boolean is also an int in Python, but not a number in the request.
+    if not isinstance(value, field_type) or (field_type is not bool and isinstance(value, bool)):
+        raise RequestError(400, f"Het veld '{name}' moet een {TYPE_NAMES[field_type]} zijn.")
+    return value
+
+
+def parse_date(value: str, name: str) -> datetime:
+    """ Parse a date in the format '2022-02-11', where an empty value is today. """
+    if value == "":
+        today = date.today()
+        return datetime(year=today.year, month=today.month, day=today.day)
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise RequestError(400, f"{name} parameter is incorrect. Het moet eruit zien als '2022-02-11'.")
+
+
+def parse_filter(body: Dict[str, Any]) -> Tuple[datetime, datetime, str, str]:
+    """ Get the filter of the motions from the body of a request, which can contain start, eind, regex and zoek, or
+    raise a RequestError if the filter is not valid in the same way as the commands check it.
+
+    :return: The start date, the end date, the regex and the query of the filter.
+    """
+    start_date = parse_date(get_field(body, "start", "2008-09-01"), "Start")
+    end_date = parse_date(get_field(body, "eind", ""), "Eind")
+    if start_date > end_date:
+        raise RequestError(400, "De start datum mag niet na de eind datum liggen.")
+
+    regex = get_field(body, "regex", ".*")
+    try:
+        re.compile(regex)
+    except re.error:
+        raise RequestError(400, "De gegeven regex string voldoet niet aan het formaat.")
+
+    query = get_field(body, "zoek", "")
+    if query != "":
+        try:
+            search(query)
+        except sqlite3.OperationalError:
+            raise RequestError(400, "De gegeven zoekopdracht voldoet niet aan het formaat.")
+    return start_date, end_date, regex, query
+
+
+def get_profile_name(body: Dict[str, Any]) -> str:
+    """ Get the name of the profile from the body of a request or raise a RequestError if the name is not valid. """
+    name = body.get("profiel", "")
+    if not isinstance(name, str) or name.strip() == "":
+        raise RequestError(400, "De profiel naam moet een niet-lege string zijn.")
+    return name
+
+
+def motion_to_json(motion: pd.Series, masks: np.ndarray, dictionary: List[str]) -> Dict[str, Any]:
+    """ Convert a motion into a JSON object.
+
+    :param masks: The party masks of the motion, from which the parties per vote are read.
+    :param dictionary: The global party dictionary of the masks.
+    """
+    proponents, absentees, opponents = (",".join(get_party_names(mask, dictionary)) for mask in masks)
+    return {
+        "Id": motion["Id"],
+        "Subject": motion["Subject"],
+        "VoteTime": motion["VoteTime"].date().isoformat(),
+        "Url": motion["Url"],
+        "Accepted": bool(motion["Accepted"]),
+        "NumProponents": int(motion["NumProponents"]),
+        "Proponents": proponents,
+        "NumAbsentees": int(motion["NumAbsentees"]),
+        "Absentees": absentees,
+        "NumOpponents": int(motion["NumOpponents"]),
+        "Opponents": opponents,
+        "Petitioners": motion["Petitioners"] if isinstance(motion["Petitioners"], str) else ""
+    }
+
+
+async def serve(host: str, port: int):
+    """ Load the motion data and serve the API until the server is stopped. """
+    server = MotionServer()
+    async with await asyncio.start_server(server.handle_connection, host, port) as http_server:
+        print(f"De MotieWijzer is bereikbaar op http://{host}:{port}")
+        await http_server.serve_forever()
+
+
+def run_server(host: str, port: int):
+    """ Run the server. """
+    asyncio.run(serve(host, port))
@@ -1,5 +1,53 @@
 # The directory which contains all data.
 DATA_DIRECTORY = "MotieWijzer/Data"
 
-# The path to the file which stores the dataframe with all motions data in it.
-MOTIONS_DATA_PATH = f"{DATA_DIRECTORY}/motions.csv"
\ No newline at end of file
+# The default number of upcoming motion PDFs that are downloaded in the background while a motion is shown.
+PREFETCH_SIZE = 3
+
+# The path to the legacy pipe-separated file which stored the dataframe with all motions data in it. If it exists it is
+# migrated to the motion store.
+MOTIONS_DATA_PATH = f"{DATA_DIRECTORY}/motions.csv"
+
+# The path to the (Parquet) file which stores the dataframe with all motions data in it.
+MOTIONS_STORE_PATH = f"{DATA_DIRECTORY}/motions.parquet"
+
+# The directory which stores the delta segments of the motion store (and their vote matrices).
+MOTIONS_SEGMENT_DIRECTORY = f"{DATA_DIRECTORY}/segments"
+
+# The path to the file which lists the segments of the motion store.
+MOTIONS_MANIFEST_PATH = f"{DATA_DIRECTORY}/motions_manifest.json"
+
+# The path to the (SQLite) index which maps the Id of every stored motion to its segment and row.
+MOTIONS_INDEX_PATH = f"{DATA_DIRECTORY}/motions_index.sqlite"
+
+# The path to the vote matrix of the base segment of the motion store, which older versions stored before the party
+# masks replaced the vote matrix. It is only used to remove the file (see remove_legacy_vote_matrices).
+LEGACY_VOTE_MATRIX_PATH = f"{DATA_DIRECTORY}/votes.npz"
+
+# The path to the file which lists all parties in the order of their bit in the party masks of the motions.
+PARTY_DICTIONARY_PATH = f"{DATA_DIRECTORY}/parties.json"
+
+# The directory in which the downloaded motion PDF files are cached.
+PDF_CACHE_DIRECTORY = f"{DATA_DIRECTORY}/pdfs"
+
+# The path to the full-text index with the text of the motion PDF files.
+SEARCH_INDEX_PATH = f"{DATA_DIRECTORY}/search.sqlite"
+
+# The path to the file which stores the materialized statistics of the motions per month.
+MONTH_STATISTICS_PATH = f"{DATA_DIRECTORY}/month_statistics.json"
+
+# The path to the (SQLite) index which maps every petitioner to the Ids of the motions it submitted.
+PETITIONER_INDEX_PATH = f"{DATA_DIRECTORY}/petitioners.sqlite"
+
+# The directory which stores which motions are selected by previously used filters.
+FILTER_CACHE_DIRECTORY = f"{DATA_DIRECTORY}/filters"
+
+# The path to the (SQLite) database which stores all saved profiles.
+PROFILE_STORE_PATH = f"{DATA_DIRECTORY}/profiles.sqlite"
+
+# The paths to the JSON report and the Prometheus text file with the metrics of the last download run.
+DOWNLOAD_REPORT_PATH = f"{DATA_DIRECTORY}/download_report.json"
+DOWNLOAD_METRICS_PATH = f"{DATA_DIRECTORY}/download_metrics.prom"
+
+# The path to the file which stores the watermark and checkpoints of the incremental downloader.
+SYNC_STATE_PATH = f"{DATA_DIRECTORY}/sync_state.json"
\ No newline at end of file
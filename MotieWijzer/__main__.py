@@ -1,31 +1,19 @@
-""" Creates the command line interface. """
+""" Creates the command line interface. The Business modules are imported inside the commands that need them, such
+that heavy packages (pandas, tkapi, requests, ...) are only loaded when they are used and e.g. '--help' starts fast. """
 import os
 from collections import Counter as counter
 from datetime import date, datetime
 import random
 import re
+import sqlite3
 
-import pandas as pd
 from colorama import Fore, Back, Style
 from typer import Typer, Argument, Option
 
-from MotieWijzer.Business import MOTIONS_DATA_PATH, DATA_DIRECTORY
-from MotieWijzer.Business.InfoRetriever import retrieve_info, filter_motions, get_all_parties
-from MotieWijzer.Business.Downloader import run_downloader
-from MotieWijzer.Business.Runner import run, load
+from MotieWijzer.Business import PREFETCH_SIZE
 
+PROFILE_LIST_SIZE = 50  # The maximum number of saved profiles that are listed by 'laden'.
 
-profile_names = []
-if os.path.isdir(DATA_DIRECTORY):
-    for file in os.listdir(DATA_DIRECTORY):
-        if file.endswith(".json"):
-            profile_names.append(file[:-5])
-            
-if profile_names:
-    profile_names = "', '".join(profile_names)
-    profile_names = f"'{profile_names}'"
-else:
-    profile_names = ""
 
 app = Typer(
     add_completion=False,
@@ -51,6 +39,29 @@ def download(
         help="Tot het eind van welke maand moties gedownload moeten worden. Bijvoorbeeld: '2024-06' betekent dat alle "
              "moties tot en met het einde van juni 2024 gedownload worden. Als dit argument leeg gelaten wordt zullen "
              "alle moties tot de dag van vandaag gedownload worden."
+    ),
+    workers: int = Option(
+        default=1,
+        help="Hoeveel maanden tegelijk gedownload en geparsed worden. Bijvoorbeeld: '8' betekent dat er 8 maanden "
+             "tegelijk gedownload worden, wat het downloaden flink versnelt. De inhoud van de motie metadata blijft "
+             "hetzelfde als bij het downloaden van een maand per keer."
+    ),
+    incremental: bool = Option(
+        default=False,
+        help="Download alleen moties die gewijzigd zijn sinds de vorige incrementele download. De resultaten worden "
+             "na elke maand opgeslagen, zodat een onderbroken download later hervat kan worden vanaf de eerste maand "
+             "die nog niet klaar was."
+    ),
+    api: str = Option(
+        default="",
+        help="Het adres van de OData API waarvan gedownload wordt. Bijvoorbeeld: 'http://127.0.0.1:8001/' om de "
+             "antwoorden van een lokale fixture server (zie het fixtures commando) te downloaden. Als dit argument "
+             "leeg gelaten wordt zal de API van de Tweede Kamer gebruikt worden."
+    ),
+    opnemen: str = Option(
+        default="",
+        help="De map waarin alle antwoorden van de OData API opgenomen worden, zodat ze later offline afgespeeld "
+             "kunnen worden met het fixtures commando. Als dit argument leeg gelaten wordt, wordt er niets opgenomen."
     )
 ):
     start = re.fullmatch(r"(\d{4})-(\d{2})", start)
@@ -72,7 +83,75 @@ def download(
         eind = eind.groups()
         end_date = date(year=int(eind[0]), month=int(eind[1]), day=1)
 
-    run_downloader(start_date, end_date)
+    if workers < 1:
+        print(Fore.WHITE + Back.RED + "Workers parameter is incorrect. Het moet minimaal 1 zijn." + Style.RESET_ALL)
+        return
+
+    if api != "" and re.fullmatch(r"https?://.+/", api) is None:
+        print(Fore.WHITE + Back.RED + "Api parameter is incorrect. Het moet eruit zien als 'http://127.0.0.1:8001/'." +
+              Style.RESET_ALL)
+        return
+
+    from MotieWijzer.Business.Downloader import run_downloader
+    run_downloader(start_date, end_date, workers, incremental, api if api else None, opnemen if opnemen else None)
+
+
+@app.command(
+    help="Start een lokale server die de met 'download --opnemen' opgenomen antwoorden van de OData API afspeelt, "
+         "zodat de downloader offline en reproduceerbaar uitgevoerd (en gebenchmarkt) kan worden. De server kan "
+         "extra vertraging en fouten toevoegen. Voorbeeld: 'python MotieWijzer fixtures opnames --vertraging 0.2 "
+         "--fouten 0.05' en daarna 'python MotieWijzer download --api http://127.0.0.1:8001/'"
+)
+def fixtures(
+    map: str = Argument(
+        help="De map met de opgenomen antwoorden."
+    ),
+    host: str = Option(
+        default="127.0.0.1",
+        help="Het adres waarop de server luistert."
+    ),
+    poort: int = Option(
+        default=8001,
+        help="De poort waarop de server luistert."
+    ),
+    vertraging: float = Option(
+        default=0.0,
+        help="Hoeveel seconden elk antwoord minimaal vertraagd wordt."
+    ),
+    spreiding: float = Option(
+        default=0.0,
+        help="Hoeveel seconden er maximaal willekeurig bij de vertraging van elk antwoord opgeteld wordt."
+    ),
+    fouten: float = Option(
+        default=0.0,
+        help="Welk deel van de requests beantwoord wordt met een fout in plaats van het opgenomen antwoord. "
+             "Bijvoorbeeld: '0.05' betekent dat 5% van de requests een fout krijgt."
+    ),
+    foutcode: int = Option(
+        default=503,
+        help="De HTTP status code van de toegevoegde fouten, bijvoorbeeld '503' of '429'."
+    ),
+    seed: int = Option(
+        default=0,
+        help="De seed die bepaalt welke requests een fout krijgen en hoeveel vertraging er opgeteld wordt."
+    )
+):
+    if not os.path.isdir(map):
+        print(Fore.WHITE + Back.RED + f"De map '{map}' bestaat niet." + Style.RESET_ALL)
+        return
+
+    if vertraging < 0 or spreiding < 0:
+        print(Fore.WHITE + Back.RED + "Vertraging en spreiding moeten minimaal 0 zijn." + Style.RESET_ALL)
+        return
+
+    if not 0 <= fouten <= 1:
+        print(Fore.WHITE + Back.RED + "Fouten parameter is incorrect. Het moet tussen 0 en 1 liggen." +
+              Style.RESET_ALL)
+        return
+
+    from MotieWijzer.Business.ODataFixtures import run_fixture_server
+    run_fixture_server(map, host, poort, vertraging, spreiding, fouten, foutcode, seed)
+
 
 @app.command(
     help="Start de MotieWijzer en bepaal welke partij in de tweede kamer het beste bij je past op basis van "
@@ -103,6 +182,13 @@ def start(
              "tenzij (?i) gebruikt wordt. De syntax voor regex staat beschreven in: "
              "https://docs.python.org/3/library/re.html"
     ),
+    zoek: str = Option(
+        default="",
+        help="Zoekopdracht die toegepast moet worden op de tekst van de motie PDF's. Hiervoor moeten de PDF's eerst "
+             "gedownload zijn met het pdfs commando. Voorbeeld: 'trein OR bus' zoekt moties waarin trein of bus "
+             "voorkomt en '\"gratis openbaar vervoer\"' zoekt moties waarin deze woorden achter elkaar voorkomen. "
+             "Als dit argument leeg gelaten wordt zal er niet op de tekst gezocht worden."
+    ),
     inclusief: str = Option(
         default="",
         help="Van welke partijen bijgehouden moeten worden hoeveel overeenkomst ze met je hebben gescheiden door een "
@@ -115,6 +201,18 @@ def start(
         help="De random seed die gebruikt moeten worden. Bij het gebruik van dezelfde seed zullen de moties in "
              "dezelfde volgorde getoond worden. Voorbeeld: '724756689' Als dit argument leeg gelaten wordt zal een "
              "willekeurige random seed gepakt worden."
+    ),
+    adaptief: bool = Option(
+        default=False,
+        help="Toon steeds de motie die het beste onderscheid maakt tussen de partijen die op dat moment het dichtst "
+             "bij elkaar staan in de ranglijst, in plaats van de moties in willekeurige volgorde te tonen. Hierdoor "
+             "is de ranglijst met minder moties stabiel. Met dezelfde seed en dezelfde antwoorden worden de moties "
+             "in dezelfde volgorde getoond."
+    ),
+    prefetch: int = Option(
+        default=PREFETCH_SIZE,
+        help="Hoeveel PDF's van de volgende moties alvast op de achtergrond gedownload worden terwijl je de huidige "
+             "motie leest. Voorbeeld: '0' betekent dat elke PDF pas gedownload wordt als de motie getoond wordt."
     )
 ):
     start = re.fullmatch(r"(\d{4})-(\d{2})-(\d{2})", start)
@@ -144,8 +242,17 @@ def start(
               Style.RESET_ALL)
         return
 
-    motions = pd.read_csv(MOTIONS_DATA_PATH, sep="|")
-    motions = filter_motions(motions, start_date, end_date, regex)
+    from MotieWijzer.Business.InfoRetriever import load_filtered_motions, get_all_parties
+    from MotieWijzer.Business.Runner import RUNNER_COLUMNS, run
+    from MotieWijzer.Business.SearchIndex import search
+    if zoek != "":
+        try:
+            search(zoek)
+        except sqlite3.OperationalError:
+            print(Fore.WHITE + Back.RED + "De gegeven zoekopdracht voldoet niet aan het formaat." + Style.RESET_ALL)
+            return
+
+    motions = load_filtered_motions(start_date, end_date, regex, zoek, RUNNER_COLUMNS)
     all_parties = get_all_parties(motions)
     if inclusief == "":
         included_parties = all_parties.copy()
@@ -161,7 +268,12 @@ def start(
     if seed < 0:
         seed = random.randint(0, 2 ** 31)
 
-    run(motions, start_date, end_date, regex, included_parties, seed, counter(), counter(), 0)
+    if prefetch < 0:
+        print(Fore.WHITE + Back.RED + "Prefetch parameter is incorrect. Het moet minimaal 0 zijn." + Style.RESET_ALL)
+        return
+
+    run(motions, start_date, end_date, regex, zoek, included_parties, seed, counter(), counter(), 0, prefetch,
+        adaptief)
 
 
 @app.command(
@@ -170,15 +282,39 @@ def start(
 def laden(
     profiel: str = Argument(
         default="",
-        help=f"De naam van het opgeslagen profiel dat geladen wordt. Je kunt kiezen uit: {profile_names}"
+        help="De naam van het opgeslagen profiel dat geladen wordt. Als dit argument leeg gelaten wordt of het profiel "
+             "niet bestaat, worden de opgeslagen profielen getoond."
+    ),
+    prefetch: int = Option(
+        default=PREFETCH_SIZE,
+        help="Hoeveel PDF's van de volgende moties alvast op de achtergrond gedownload worden terwijl je de huidige "
+             "motie leest. Voorbeeld: '0' betekent dat elke PDF pas gedownload wordt als de motie getoond wordt."
     )
 ):
-    file_name = f"{DATA_DIRECTORY}/{profiel}.json"
-    if not os.path.isfile(file_name):
-        print(Fore.WHITE + Back.RED + f"De file '{file_name}' bestaat niet" + Style.RESET_ALL)
+    from MotieWijzer.Business.ProfileStore import get_profile_names, has_profile
+    if profiel == "" or not has_profile(profiel):
+        if profiel != "":
+            print(Fore.WHITE + Back.RED + f"Het profiel '{profiel}' bestaat niet." + Style.RESET_ALL)
+        names = get_profile_names(profiel, PROFILE_LIST_SIZE)  # Suggest the profiles that start with the given name.
+        if not names:
+            names = get_profile_names(limit=PROFILE_LIST_SIZE)
+        if not names:
+            print("Er zijn nog geen opgeslagen profielen.")
+            return
+
+        joined_names = "', '".join(names)
+        print(f"Je kunt kiezen uit de volgende profielen: '{joined_names}'")
+        if len(names) == PROFILE_LIST_SIZE:
+            print(f"Alleen de eerste {PROFILE_LIST_SIZE} profielen worden getoond. Geef het begin van de naam om de "
+                  f"profielen te tonen die daarmee beginnen.")
+        return
+
+    if prefetch < 0:
+        print(Fore.WHITE + Back.RED + "Prefetch parameter is incorrect. Het moet minimaal 0 zijn." + Style.RESET_ALL)
         return
 
-    load(file_name)
+    from MotieWijzer.Business.Runner import load
+    load(profiel, prefetch)
 
 
 @app.command(
@@ -208,6 +344,13 @@ def info(
              "tenzij (?i) gebruikt wordt. De syntax voor regex staat beschreven in: "
              "https://docs.python.org/3/library/re.html"
     ),
+    zoek: str = Option(
+        default="",
+        help="Zoekopdracht die toegepast moet worden op de tekst van de motie PDF's. Hiervoor moeten de PDF's eerst "
+             "gedownload zijn met het pdfs commando. Voorbeeld: 'trein OR bus' zoekt moties waarin trein of bus "
+             "voorkomt en '\"gratis openbaar vervoer\"' zoekt moties waarin deze woorden achter elkaar voorkomen. "
+             "Als dit argument leeg gelaten wordt zal er niet op de tekst gezocht worden."
+    ),
 ):
     start = re.fullmatch(r"(\d{4})-(\d{2})-(\d{2})", start)
     if start is None:
@@ -236,7 +379,275 @@ def info(
               Style.RESET_ALL)
         return
 
-    retrieve_info(start_date, end_date, regex)
+    from MotieWijzer.Business.InfoRetriever import retrieve_info
+    from MotieWijzer.Business.SearchIndex import search
+    if zoek != "":
+        try:
+            search(zoek)
+        except sqlite3.OperationalError:
+            print(Fore.WHITE + Back.RED + "De gegeven zoekopdracht voldoet niet aan het formaat." + Style.RESET_ALL)
+            return
+
+    retrieve_info(start_date, end_date, regex, zoek)
+
+
+@app.command(
+    help="Laat zien hoe vaak elk paar partijen hetzelfde gestemd heeft op de moties, met dezelfde filters als het info "
+         "commando. Alleen moties waarbij beide partijen bestonden tellen mee en een partij die niet deelnam aan de "
+         "stemming stemde nooit hetzelfde. De resultaten worden per filter bewaard, zodat dezelfde opvraag daarna "
+         "direct beantwoord wordt. Voorbeeld 'python MotieWijzer overeenkomst --start 2022-02-11 --formaat csv "
+         "--uitvoer overeenkomst.csv'"
+)
+def overeenkomst(
+    start: str = Option(
+        default="2008-09-01",
+        help="Vanaf welke dag moties meegeteld worden. Bijvoorbeeld: '2022-02-11' betekent dat alle moties vanaf "
+             "2022-02-11 meegeteld worden. Als dit argument leeg gelaten wordt zullen alle moties vanaf het begin van "
+             "de metadata meegeteld worden."
+    ),
+    eind: str = Option(
+        default="",
+        help="Tot en met welke dag moties meegeteld worden. Bijvoorbeeld: '2024-06-23' betekent dat alle moties tot "
+             "en met 2024-06-23 meegeteld worden. Als dit argument leeg gelaten wordt zullen alle moties tot en met de "
+             "dag van vandaag meegeteld worden."
+    ),
+    regex: str = Option(
+        default=".*",
+        help="Regex filtering die toegepast moet worden op de motie titels. Hierdoor kun je moties selecteren die "
+             "over een specifiek thema gaan. Voorbeeld: '.*(?i:bus|trein|infrastructuur|mobiliteit|auto|fiets).*' telt "
+             "voornamelijk moties mee die over vervoer gaan. De syntax voor regex staat beschreven in: "
+             "https://docs.python.org/3/library/re.html"
+    ),
+    zoek: str = Option(
+        default="",
+        help="Zoekopdracht die toegepast moet worden op de tekst van de motie PDF's. Hiervoor moeten de PDF's eerst "
+             "gedownload zijn met het pdfs commando. Als dit argument leeg gelaten wordt zal er niet op de tekst "
+             "gezocht worden."
+    ),
+    uitvoer: str = Option(
+        default="-",
+        help="Het bestand waarin de overeenkomst geschreven wordt. Als dit argument leeg gelaten wordt zal de "
+             "overeenkomst in de console getoond worden."
+    ),
+    formaat: str = Option(
+        default="tekst",
+        help="Het formaat van de overeenkomst: 'tekst' voor een regel per partij met de andere partijen van meeste "
+             "naar minste overeenkomst, 'csv' voor een regel per paar partijen of 'json' voor de hele matrix."
+    )
+):
+    start = re.fullmatch(r"(\d{4})-(\d{2})-(\d{2})", start)
+    if start is None:
+        print(Fore.WHITE + Back.RED + "Start parameter is incorrect. Het moet eruit zien als '2022-02-11'." +
+              Style.RESET_ALL)
+        return
+    start = start.groups()
+    start_date = datetime(year=int(start[0]), month=int(start[1]), day=int(start[2]))
+
+    if eind == "":
+        today = date.today()
+        end_date = datetime(year=today.year, month=today.month, day=today.day)
+    else:
+        eind = re.fullmatch(r"(\d{4})-(\d{2})-(\d{2})", eind)
+        if eind is None:
+            print(Fore.WHITE + Back.RED + "Eind parameter is incorrect. Het moet eruit zien als '2024-06-23'." +
+                  Style.RESET_ALL)
+            return
+        eind = eind.groups()
+        end_date = datetime(year=int(eind[0]), month=int(eind[1]), day=int(eind[2]))
+
+    try:
+        re.compile(regex)
+    except:
+        print(Fore.WHITE + Back.RED + "De gegeven regex string voldoet niet aan het formaat." +
+              Style.RESET_ALL)
+        return
+
+    if formaat not in ("tekst", "csv", "json"):
+        print(Fore.WHITE + Back.RED + "Formaat parameter is incorrect. Het moet 'tekst', 'csv' of 'json' zijn." +
+              Style.RESET_ALL)
+        return
+
+    from MotieWijzer.Business.AgreementMatrix import run_agreement
+    from MotieWijzer.Business.SearchIndex import search
+    if zoek != "":
+        try:
+            search(zoek)
+        except sqlite3.OperationalError:
+            print(Fore.WHITE + Back.RED + "De gegeven zoekopdracht voldoet niet aan het formaat." + Style.RESET_ALL)
+            return
+
+    run_agreement(start_date, end_date, regex, zoek, uitvoer, formaat)
+
+
+@app.command(
+    help="Download alvast alle motie PDF's naar de lokale PDF cache, zodat de MotieWijzer daarna zonder internet "
+         "gebruikt kan worden. PDF's die al gedownload zijn worden overgeslagen, dus een onderbroken download kan "
+         "hervat worden door het commando opnieuw uit te voeren. Voorbeeld 'python MotieWijzer pdfs --start "
+         "2022-02-01 --eind 2024-06-30 --workers 4'"
+)
+def pdfs(
+    start: str = Option(
+        default="2008-09-01",
+        help="Vanaf welke dag motie PDF's gedownload moeten worden. Bijvoorbeeld: '2022-02-11' betekent dat alle "
+             "PDF's van moties vanaf 11 februari 2022 gedownload worden. Als dit argument leeg gelaten wordt zullen "
+             "alle PDF's vanaf het begin van de metadata gedownload worden."
+    ),
+    eind: str = Option(
+        default="",
+        help="Tot en met welke dag motie PDF's gedownload moeten worden. Bijvoorbeeld: '2024-06-23' betekent dat alle "
+             "PDF's van moties tot en met 23 juni 2024 gedownload worden. Als dit argument leeg gelaten wordt zullen "
+             "alle PDF's tot en met de dag van vandaag gedownload worden."
+    ),
+    regex: str = Option(
+        default=".*",
+        help="Regex filtering die toegepast moet worden op de motie titels. Hierdoor kun je alleen de PDF's van "
+             "moties downloaden die over een specifiek thema gaan. Voorbeeld: "
+             "'.*(?i:bus|trein|infrastructuur|mobiliteit|auto|fiets).*' downloadt voornamelijk moties die over "
+             "vervoer gaan. De syntax voor regex staat beschreven in: https://docs.python.org/3/library/re.html"
+    ),
+    workers: int = Option(
+        default=4,
+        help="Hoeveel PDF's maximaal tegelijk gedownload worden."
+    ),
+    snelheid: float = Option(
+        default=5.0,
+        help="Hoeveel PDF downloads maximaal per seconde gestart worden, zodat de server van de Tweede Kamer niet "
+             "overbelast wordt. Voorbeeld: '0' betekent dat er geen limiet is."
+    )
+):
+    start = re.fullmatch(r"(\d{4})-(\d{2})-(\d{2})", start)
+    if start is None:
+        print(Fore.WHITE + Back.RED + "Start parameter is incorrect. Het moet eruit zien als '2022-02-11'." +
+              Style.RESET_ALL)
+        return
+    start = start.groups()
+    start_date = datetime(year=int(start[0]), month=int(start[1]), day=int(start[2]))
+
+    if eind == "":
+        today = date.today()
+        end_date = datetime(year=today.year, month=today.month, day=today.day)
+    else:
+        eind = re.fullmatch(r"(\d{4})-(\d{2})-(\d{2})", eind)
+        if eind is None:
+            print(Fore.WHITE + Back.RED + "Eind parameter is incorrect. Het moet eruit zien als '2024-06-23'." +
+                  Style.RESET_ALL)
+            return
+        eind = eind.groups()
+        end_date = datetime(year=int(eind[0]), month=int(eind[1]), day=int(eind[2]))
+
+    try:
+        re.compile(regex)
+    except:
+        print(Fore.WHITE + Back.RED + "De gegeven regex string voldoet niet aan het formaat." +
+              Style.RESET_ALL)
+        return
+
+    if workers < 1:
+        print(Fore.WHITE + Back.RED + "Workers parameter is incorrect. Het moet minimaal 1 zijn." + Style.RESET_ALL)
+        return
+
+    from MotieWijzer.Business.InfoRetriever import load_filtered_motions
+    from MotieWijzer.Business.PdfCache import get_budget
+    from MotieWijzer.Business.PdfDownloader import run_pdf_downloader
+    from MotieWijzer.Business.SearchIndex import index_pdfs
+    motions = load_filtered_motions(start_date, end_date, regex, columns=["Id", "Url", "Size"])
+    required_size = motions["Size"].sum()
+    if required_size > get_budget():
+        print(Fore.WHITE + Back.RED + f"De PDF's zijn samen {required_size / 1024 / 1024:.1f} MB, wat meer is dan de "
+                                      f"maximale grootte van de PDF cache. Verhoog deze eerst met 'python MotieWijzer "
+                                      f"cache --budget'." + Style.RESET_ALL)
+        return
+
+    run_pdf_downloader(motions, workers, snelheid)
+    index_pdfs(motions["Id"].tolist())
+
+
+@app.command(
+    help="Bereken zonder interactie de overeenkomst met alle partijen voor veel respondenten tegelijk. Elke "
+         "respondent geeft per motie Id een antwoord: '+' (voor), '0' (geen mening) of '-' (tegen). Net als bij het "
+         "start commando wordt een afwezige partij beschouwd als tegenstrijdig met de respondent. Voorbeeld: 'python "
+         "MotieWijzer batch antwoorden.csv --uitvoer resultaten.csv'"
+)
+def batch(
+    invoer: str = Argument(
+        help="Het bestand met de antwoorden van alle respondenten. Dit is een JSON bestand (eindigend op .json) met "
+             "per respondent een object van motie Id naar antwoord, of een CSV bestand met de kolommen Respondent, Id "
+             "en Answer."
+    ),
+    uitvoer: str = Option(
+        default="-",
+        help="Het bestand waarin de resultaten geschreven worden. Als dit argument leeg gelaten wordt zullen de "
+             "resultaten in de console getoond worden."
+    ),
+    formaat: str = Option(
+        default="csv",
+        help="Het formaat van de resultaten: 'csv' voor een regel per respondent en partij of 'json' voor een JSON "
+             "object per respondent per regel."
+    )
+):
+    if not os.path.isfile(invoer):
+        print(Fore.WHITE + Back.RED + f"De file '{invoer}' bestaat niet" + Style.RESET_ALL)
+        return
+
+    if formaat not in ("csv", "json"):
+        print(Fore.WHITE + Back.RED + "Formaat parameter is incorrect. Het moet 'csv' of 'json' zijn." +
+              Style.RESET_ALL)
+        return
+
+    from MotieWijzer.Business.BatchScorer import run_batch_scorer
+    run_batch_scorer(invoer, uitvoer, formaat)
+
+
+@app.command(
+    help="Start een lokale HTTP server waarmee meerdere gebruikers tegelijk de MotieWijzer kunnen doen. De motie "
+         "metadata wordt maar een keer geladen en gedeeld door alle sessies. Voorbeeld: 'python MotieWijzer serve "
+         "--poort 8000'"
+)
+def serve(
+    host: str = Option(
+        default="127.0.0.1",
+        help="Het adres waarop de server luistert. Als dit argument leeg gelaten wordt is de server alleen op deze "
+             "computer bereikbaar."
+    ),
+    poort: int = Option(
+        default=8000,
+        help="De poort waarop de server luistert."
+    )
+):
+    from MotieWijzer.Business.Server import run_server
+    run_server(host, poort)
+
+
+@app.command(
+    help="Laat zien hoeveel motie PDF's lokaal opgeslagen zijn en hoeveel ruimte ze innemen. De PDF's die het langst "
+         "niet gebruikt zijn worden verwijderd als de maximale grootte overschreden wordt. Voorbeeld: 'python "
+         "MotieWijzer cache --budget 200 --opschonen'"
+)
+def cache(
+    budget: int = Option(
+        default=-1,
+        help="De nieuwe maximale grootte van de PDF cache in MB. Bijvoorbeeld: '200' betekent dat er maximaal 200 MB "
+             "aan PDF's opgeslagen wordt. Als dit argument leeg gelaten wordt blijft de maximale grootte hetzelfde."
+    ),
+    opschonen: bool = Option(
+        default=False,
+        help="Verwijder de PDF's die het langst niet gebruikt zijn totdat de cache binnen de maximale grootte past."
+    )
+):
+    from MotieWijzer.Business.PdfCache import evict, get_budget, get_cache_statistics, set_budget
+    if budget >= 0:
+        set_budget(budget * 1024 * 1024)
+    if opschonen or budget >= 0:
+        removed = evict(get_budget())
+        print(f"Aantal verwijderde PDF's: {removed}")
+
+    statistics = get_cache_statistics()
+    print()
+    print(f"Aantal PDF's: {statistics['files']}")
+    print(f"Grootte: {statistics['size'] / 1024 / 1024:.1f} MB")
+    print(f"Maximale grootte: {statistics['budget'] / 1024 / 1024:.1f} MB")
+    print()
+
 
 if __name__ == "__main__":
     app()
\ No newline at end of file
@@ -0,0 +1,96 @@
+""" Times the downloader offline against OData responses that were recorded with 'python MotieWijzer download --opnemen'
+and are replayed by a local fixture server (see MotieWijzer/Business/ODataFixtures.py). The server adds latency and
+errors, such that the effect of the number of workers on a slow or unreliable API can be measured reproducibly. Every
+run downloads into its own temporary working directory, so the data directory of the repository is never touched. Run
+it from the root of the repository, e.g.: 'python benchmarks/download.py opnames --start 2020-01 --end 2020-12
+--workers 1 4 8 --latency 0.0 0.2' """
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime
+from typing import Any, Dict
+
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY_DIRECTORY)
+
+from suite import get_commit
+from MotieWijzer.Business.Downloader import metrics, run_downloader
+from MotieWijzer.Business.ODataFixtures import FixtureServer
+
+
+def parse_month(text: str) -> date:
+    """ Parse a month in the format YYYY-MM. """
+    return datetime.strptime(text, "%Y-%m").date()
+
+
+def benchmark_download(directory: str, start_date: date, end_date: date, workers: int, latency: float, jitter: float,
+                       error_rate: float, seed: int, repeat: int) -> Dict[str, Any]:
+    """ Download the months from a fixture server that replays the fixtures in the directory.
+
+    :return: The settings, the median time, the time of every repetition, the number of failed repetitions (e.g. due to
+        injected errors) and the total download metrics of the last repetition.
+    """
+    times, failures = [], 0
+    for _ in range(repeat):
+        with FixtureServer(directory, "127.0.0.1", 0, latency, jitter, error_rate, seed=seed) as server:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            working_directory = os.getcwd()
+            with tempfile.TemporaryDirectory() as temporary_directory:
+                os.chdir(temporary_directory)
+                os.mkdir("MotieWijzer")
+                start_time = time.perf_counter()
+                try:
+                    run_downloader(start_date, end_date, workers, api_root=server.api_root)
+                except Exception as e:
+                    failures += 1
+                    print(f"download failed: {e!r}")
+                finally:
+                    times.append(time.perf_counter() - start_time)
+                    os.chdir(working_directory)
+                    server.shutdown()
+
+    print(f"workers={workers:<3} latency={latency:<6} error_rate={error_rate:<6}: {statistics.median(times):.3f}s")
+    return {"workers": workers, "latency": latency, "jitter": jitter, "error_rate": error_rate,
+            "median": statistics.median(times), "times": times, "failures": failures,
+            "metrics": metrics.get_report()["total"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("directory", help="The directory with the recorded fixtures.")
+    parser.add_argument("--start", type=parse_month, required=True,
+                        help="The first month (YYYY-MM) that is downloaded.")
+    parser.add_argument("--end", type=parse_month, required=True, help="The last month (YYYY-MM) that is downloaded.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4], help="The numbers of workers that are used.")
+    parser.add_argument("--latency", type=float, nargs="+", default=[0.0, 0.2],
+                        help="The minimum latencies in seconds of every response.")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="The maximum number of seconds that is randomly added to the latency of every response.")
+    parser.add_argument("--error-rates", type=float, nargs="+", default=[0.0],
+                        help="The fractions of the requests that are answered with an error.")
+    parser.add_argument("--seed", type=int, default=0, help="The seed of the latency jitter and injected errors.")
+    parser.add_argument("--repeat", type=int, default=3, help="The number of times every download is run.")
+    parser.add_argument("--output", default="benchmarks/download_results.json", help="The JSON file that is written.")
+    arguments = parser.parse_args()
+    directory = os.path.abspath(arguments.directory)
+
+    results = []
+    for workers in arguments.workers:
+        for latency in arguments.latency:
+            for error_rate in arguments.error_rates:
+                results.append(benchmark_download(directory, arguments.start, arguments.end, workers, latency,
+                                                  arguments.jitter, error_rate, arguments.seed, arguments.repeat))
+
+    with open(arguments.output, "w") as f:
+        json.dump({"commit": get_commit(), "time": datetime.now().isoformat(timespec="seconds"), "results": results}, f,
+                  indent=2)
+    print(f"results written to {os.path.abspath(arguments.output)}")
+
+
+if __name__ == "__main__":
+    main()
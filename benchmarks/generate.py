@@ -0,0 +1,126 @@
+""" Generates a synthetic, but realistic, motions (Dutch: moties) dataset in the same format as the downloader produces.
+Parties are founded and dissolved over time (party churn), every party has a political position that determines how it
+votes, and the subjects contain themes such that regexes select a realistic part of the motions. Example:
+'python benchmarks/generate.py --motions 100000 --parties 25 --output MotieWijzer/Data/motions.csv' """
+import argparse
+import uuid
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+START_TIME = datetime(2008, 9, 1)  # The time of the first generated motion.
+END_TIME = datetime(2025, 12, 31)  # The time of the last generated motion.
+PERMANENT_PARTIES = 4  # The number of parties that exist during all motions, such that there is always a vote.
+DISSOLVE_PROBABILITY = 0.5  # The probability that a (non permanent) party is dissolved before the last motion.
+ABSENT_PROBABILITY = 0.03  # The probability that a party did not vote (Dutch: niet deelgenomen) for a motion.
+
+# The themes of which the subjects of the motions are composed.
+THEMES = ["trein", "bus", "infrastructuur", "mobiliteit", "fiets", "zorg", "onderwijs", "woningbouw", "klimaat",
+          "stikstof", "defensie", "belastingen", "pensioenen", "asiel", "landbouw", "energie", "veiligheid", "cultuur"]
+ACTIONS = ["over", "inzake", "ter verbetering van", "tot het onderzoeken van", "tegen bezuinigingen op"]
+
+
+def generate_parties(count: int, rng: np.random.Generator) -> DataFrame:
+    """ Generate the parties with the time they are founded and dissolved, their position and their number of seats.
+
+    :return: A dataframe with the columns Name, Founded, Dissolved (as seconds since START_TIME), Position and Seats.
+    """
+    span = (END_TIME - START_TIME).total_seconds()
+    founded = rng.uniform(-0.5 * span, span, count)  # About a third of the parties already exists at the start.
+    founded[:PERMANENT_PARTIES] = -1.0
+    founded = np.maximum(founded, 0.0)
+    dissolved = np.where(rng.random(count) < DISSOLVE_PROBABILITY, founded + rng.uniform(0.1, 1.0, count) * span,
+                         np.inf)
+    dissolved[:PERMANENT_PARTIES] = np.inf
+    return pd.DataFrame({
+        "Name": [f"Partij {i + 1}" for i in range(count)],
+        "Founded": founded,
+        "Dissolved": dissolved,
+        "Position": rng.uniform(-1.0, 1.0, count),
+        "Seats": rng.integers(1, 36, count)
+    })
+
+
+def join_parties(names: np.ndarray, selection: np.ndarray) -> np.ndarray:
+    """ Join the names of the selected parties of every motion with a comma ','. Only the distinct selections are
+    joined, such that millions of motions can be generated quickly.
+
+    :param names: The names of the parties.
+    :param selection: A boolean matrix with a row for every motion and a column for every party (at most 64).
+    :return: The joined party names for every motion.
+    """
+    keys = selection.astype(np.uint64) @ (np.uint64(1) << np.arange(selection.shape[1], dtype=np.uint64))
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    joined = np.array([",".join(names[selection[row]]) for row in first], dtype=object)
+    return joined[inverse]
+
+
+def generate_motions(count: int, party_count: int = 20, seed: int = 0, id_offset: int = 0) -> DataFrame:
+    """ Generate synthetic motions with the same columns as the downloader produces.
+
+    :param count: The number of motions that are generated.
+    :param party_count: The number of parties that exist at some point in time.
+    :param seed: The seed of the random generator, the same seed always generates the same motions.
+    :param id_offset: Is added to the number from which the Id of every motion is derived, such that motions with
+        distinct Ids can be generated for the same seed.
+    :return: The motions ordered by vote time, where the VoteTime is formatted as it is stored in the legacy CSV file.
+    """
+    rng = np.random.default_rng(seed)
+    parties = generate_parties(party_count, rng)
+    names = parties["Name"].to_numpy()
+
+    span = (END_TIME - START_TIME).total_seconds()
+    times = np.sort(rng.uniform(0.0, span, count))
+    existing = (parties["Founded"].to_numpy() <= times[:, None]) & (times[:, None] < parties["Dissolved"].to_numpy())
+
+    # A party votes in favor if its position is on the same side as the direction of the motion, with some noise.
+    direction = rng.uniform(-1.0, 1.0, count)
+    support = direction[:, None] * parties["Position"].to_numpy() + rng.normal(0.0, 0.3, (count, party_count))
+    absent = existing & (rng.random((count, party_count)) < ABSENT_PROBABILITY)
+    in_favor = existing & ~absent & (support > 0.0)
+    against = existing & ~absent & (support <= 0.0)
+
+    seats = parties["Seats"].to_numpy()
+    num_proponents = in_favor @ seats
+    num_opponents = against @ seats
+
+    ids = [str(uuid.UUID(int=(seed << 64) + id_offset + i)) for i in range(count)]
+    themes = rng.integers(0, len(THEMES), count)
+    actions = rng.integers(0, len(ACTIONS), count)
+    petitioner_parties = rng.integers(0, party_count, count)
+    vote_times = pd.to_datetime(START_TIME) + pd.to_timedelta(times.astype(np.int64), unit="s")
+    return pd.DataFrame({
+        "Id": ids,
+        "Subject": [f"Motie van het lid {i % 150 + 1} {ACTIONS[a]} {THEMES[t]}"
+                    for i, (a, t) in enumerate(zip(actions, themes))],
+        "VoteTime": vote_times.strftime("%Y-%m-%d %H:%M:%S") + "+01:00",
+        "Url": [f"https://gegevensmagazijn.tweedekamer.nl/OData/v4/2.0/document/{id}/resource" for id in ids],
+        "Size": rng.integers(20_000, 400_000, count),
+        "Accepted": num_proponents > num_opponents,
+        "NumProponents": num_proponents,
+        "Proponents": join_parties(names, in_favor),
+        "NumAbsentees": absent @ seats,
+        "Absentees": join_parties(names, absent),
+        "NumOpponents": num_opponents,
+        "Opponents": join_parties(names, against),
+        "Petitioners": [f"Lid {i % 150 + 1} ({names[p]})" for i, p in enumerate(petitioner_parties)]
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--motions", type=int, default=10_000, help="The number of motions that are generated.")
+    parser.add_argument("--parties", type=int, default=20, help="The number of parties that exist at some point.")
+    parser.add_argument("--seed", type=int, default=0, help="The seed of the random generator.")
+    parser.add_argument("--output", default="motions.csv", help="The pipe-separated CSV file that is written.")
+    arguments = parser.parse_args()
+
+    motions = generate_motions(arguments.motions, arguments.parties, arguments.seed)
+    motions.to_csv(arguments.output, sep="|", index=False)
+    print(f"wrote {len(motions)} motions to {arguments.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+""" Measures how long it takes before the command line interface responds, by running 'python MotieWijzer --help' a
+number of times. Fails if the median time exceeds the budget or if importing the command line interface loads heavy
+packages. Run it from the root of the repository: 'python benchmarks/startup.py --budget 0.5' """
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+# The packages that should only be loaded by the commands that use them.
+HEAVY_MODULES = ["numpy", "pandas", "pyarrow", "pypdf", "requests", "tkapi"]
+
+
+def measure_startup(runs: int) -> list:
+    """ Measure the wall clock time of 'python MotieWijzer --help' in seconds for every run. """
+    times = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        subprocess.run([sys.executable, "MotieWijzer", "--help"], check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start_time)
+    return times
+
+
+def get_loaded_heavy_modules() -> list:
+    """ Get the heavy packages that are loaded by importing the command line interface. """
+    code = (f"import sys; import MotieWijzer.__main__; "
+            f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+    return [m for m in output.strip().split(",") if m]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10, help="The number of times the command line is started.")
+    parser.add_argument("--budget", type=float, default=0.5, help="The maximum median startup time in seconds.")
+    arguments = parser.parse_args()
+
+    times = measure_startup(arguments.runs)
+    median = statistics.median(times)
+    print(f"startup median: {median:.3f}s, min: {min(times):.3f}s, max: {max(times):.3f}s "
+          f"(budget: {arguments.budget:.3f}s)")
+
+    loaded = get_loaded_heavy_modules()
+    if loaded:
+        print(f"heavy modules loaded at startup: {', '.join(loaded)}")
+    if median > arguments.budget or loaded:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+""" Times the hot paths of the MotieWijzer on synthetic datasets (see generate.py) of different sizes and writes the
+results as JSON, such that runs can be compared to find regressions. Every dataset is stored in its own temporary
+working directory, so the data directory of the repository is never touched. Run it from the root of the repository:
+'python benchmarks/suite.py --sizes 10000 100000 1000000 --output benchmarks/results.json --baseline old.json' """
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter as counter
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY_DIRECTORY)
+
+import numpy as np
+
+from generate import generate_motions
+from MotieWijzer.Business.AgreementMatrix import compute_agreement
+from MotieWijzer.Business import DATA_DIRECTORY, FILTER_CACHE_DIRECTORY, MOTIONS_DATA_PATH
+from MotieWijzer.Business.Downloader import store_rows
+from MotieWijzer.Business.InfoRetriever import INFO_COLUMNS, filter_motions, get_all_parties, \
+    get_partially_missing_parties
+from MotieWijzer.Business.MonthStatistics import get_period_statistics
+from MotieWijzer.Business.MotionStore import PARTY_COLUMNS, load_motions, migrate_motions
+from MotieWijzer.Business.PartyMasks import build_party_masks, get_party_masks
+from MotieWijzer.Business.Runner import update_scores
+
+START_DATE = datetime(2008, 9, 1)  # The start date of the filters, which includes all generated motions.
+END_DATE = datetime(2025, 12, 31)  # The end date of the filters, which includes all generated motions.
+MONTH_START_DATE = datetime(2020, 3, 1)  # The start date of the month that is loaded from the motion store.
+MONTH_END_DATE = datetime(2020, 3, 31)  # The end date of the month that is loaded from the motion store.
+SELECTIVE_REGEX = ".*(?i:bus|trein|infrastructuur|mobiliteit|fiets).*"  # Selects about a quarter of the motions.
+MERGE_SIZE = 2000  # The number of rows that are merged into the store, of which half replaces existing motions.
+
+
+def run_benchmark(name: str, size: int, function: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    """ Measure the wall clock time of calling the function in seconds for every repetition.
+
+    :return: The name of the benchmark, the number of motions, the median time and the time of every repetition.
+    """
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start_time)
+    print(f"{name:<32}{size:>10} motions: {statistics.median(times):.4f}s")
+    return {"benchmark": name, "motions": size, "median": statistics.median(times), "times": times}
+
+
+def answer_motions(masks: np.ndarray, dictionary: List[str], accepted: np.ndarray):
+    """ Answer all given motions like a user of the runner does, alternating between in favor and against. """
+    scores, totals = counter(), counter()
+    for i in range(masks.shape[1]):
+        update_scores(masks[:, i], dictionary, bool(accepted[i]) == (i % 2 == 0), scores, totals)
+
+
+def run_cold_start():
+    """ Run the info command in a new process, after the cached filter results are removed. """
+    shutil.rmtree(FILTER_CACHE_DIRECTORY, ignore_errors=True)
+    environment = {**os.environ, "PYTHONPATH": REPOSITORY_DIRECTORY}
+    subprocess.run([sys.executable, "-m", "MotieWijzer", "info"], check=True, stdout=subprocess.DEVNULL,
+                   env=environment)
+
+
+def benchmark_size(size: int, parties: int, repeat: int, answers: int) -> List[Dict[str, Any]]:
+    """ Run all benchmarks on a synthetic dataset of the given size. The current working directory must be an empty
+    temporary directory, because the data directory is relative to it.
+
+    :param answers: The maximum number of motions that are answered in the update_scores loop.
+    :return: The results of every benchmark (see run_benchmark).
+    """
+    os.makedirs(DATA_DIRECTORY)
+    generate_motions(size, parties).to_csv(MOTIONS_DATA_PATH, sep="|", index=False)
+
+    # The migration is measured before anything else, because it replaces the motion store and thereby invalidates the
+    # party masks, which would otherwise be rebuilt inside one of the other benchmarks.
+    results = [run_benchmark("migrate_motions", size, migrate_motions, repeat)]
+
+    motions = load_motions(INFO_COLUMNS)
+    selected = filter_motions(motions, START_DATE, END_DATE, SELECTIVE_REGEX)
+    all_parties = get_all_parties(motions)
+
+    answered = motions.iloc[:answers]
+    masks, dictionary = get_party_masks(answered)
+    accepted = load_motions(["Accepted"])["Accepted"].to_numpy()[:len(answered)]
+
+    # The merged rows look like freshly parsed rows: half of them are new motions and half of them replace motions that
+    # are spread over the whole store.
+    stored = load_motions()
+    rows = generate_motions(MERGE_SIZE // 2, parties, seed=1).to_dict("records")
+    replaced = stored.iloc[::max(len(stored) // (MERGE_SIZE // 2), 1)].iloc[:MERGE_SIZE // 2]
+    replaced = replaced.astype({"VoteTime": str, **{c: object for c in PARTY_COLUMNS}})
+    replaced = replaced.fillna({c: "" for c in PARTY_COLUMNS})
+    replaced["Accepted"] = ~replaced["Accepted"]
+    rows += replaced.to_dict("records")
+
+    benchmarks = [
+        ("load_motions", lambda: load_motions(INFO_COLUMNS)),
+        ("load_motions_month", lambda: load_motions(INFO_COLUMNS, MONTH_START_DATE, MONTH_END_DATE)),
+        ("filter_motions", lambda: filter_motions(motions, START_DATE, END_DATE, ".*")),
+        ("filter_motions_regex", lambda: filter_motions(motions, START_DATE, END_DATE, SELECTIVE_REGEX)),
+        ("build_party_masks", lambda: build_party_masks(stored)),
+        ("get_all_parties", lambda: get_all_parties(selected)),
+        ("get_partially_missing_parties", lambda: get_partially_missing_parties(selected, all_parties)),
+        ("get_period_statistics", lambda: get_period_statistics(START_DATE, END_DATE)),
+        ("compute_agreement", lambda: compute_agreement(*get_party_masks(selected))),
+        ("update_scores_loop", lambda: answer_motions(masks, dictionary, accepted)),
+        ("store_rows_merge", lambda: store_rows(rows)),
+        ("cold_start_info", run_cold_start),
+    ]
+    results += [run_benchmark(name, size, function, repeat) for name, function in benchmarks]
+    return results
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str, tolerance: float) -> bool:
+    """ Compare the results with the results of a previous run.
+
+    :param tolerance: The maximum ratio between the new and the old median time that is not a regression.
+    :return: True if none of the benchmarks regressed, otherwise False.
+    """
+    with open(baseline_path, "r") as f:
+        baseline = {(r["benchmark"], r["motions"]): r["median"] for r in json.load(f)["results"]}
+
+    passed = True
+    for result in results:
+        old_median = baseline.get((result["benchmark"], result["motions"]))
+        if old_median is None or old_median == 0:
+            continue
+        ratio = result["median"] / old_median
+        regressed = ratio > tolerance
+        passed &= not regressed
+        print(f"{result['benchmark']:<32}{result['motions']:>10} motions: {ratio:.2f}x"
+              f"{' REGRESSION' if regressed else ''}")
+    return passed
+
+
+def get_commit() -> str:
+    """ Get the commit of the repository that is benchmarked, or an empty string if it is unknown. """
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPOSITORY_DIRECTORY, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="The numbers of motions of the datasets that are benchmarked.")
+    parser.add_argument("--parties", type=int, default=20, help="The number of parties that exist at some point.")
+    parser.add_argument("--repeat", type=int, default=3, help="The number of times every benchmark is run.")
+    parser.add_argument("--answers", type=int, default=100_000,
+                        help="The maximum number of motions that are answered in the update_scores loop.")
+    parser.add_argument("--output", default="benchmarks/results.json", help="The JSON file that is written.")
+    parser.add_argument("--baseline", default="", help="A JSON file of a previous run to compare the results with.")
+    parser.add_argument("--tolerance", type=float, default=1.2,
+                        help="The maximum ratio between the new and old median time that is not a regression.")
+    arguments = parser.parse_args()
+    output = os.path.abspath(arguments.output)
+    baseline = os.path.abspath(arguments.baseline) if arguments.baseline else ""
+
+    results = []
+    working_directory = os.getcwd()
+    for size in arguments.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                results += benchmark_size(size, arguments.parties, arguments.repeat, arguments.answers)
+            finally:
+                os.chdir(working_directory)
+
+    with open(output, "w") as f:
+        json.dump({
+            "commit": get_commit(),
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "results": results
+        }, f, indent=2)
+    print(f"results written to {output}")
+
+    if baseline and not compare(results, baseline, arguments.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()